@@ -2,6 +2,7 @@
 Configuration settings for Food Trend Predictor
 """
 
+import functools
 import os
 from dotenv import load_dotenv
 
@@ -110,22 +111,55 @@ TREND_THRESHOLDS = {
     'min_growth_rate': 0.1,
 }
 
+# Inverted index: food -> category, built once so category lookups are a
+# single dict hit instead of a scan over every category's food list
+FOOD_TO_CATEGORY = {
+    food.lower(): category
+    for category, foods in FOOD_CATEGORIES.items()
+    for food in foods
+}
+
+# Fast membership tests during mention extraction
+FOOD_TERMS_FROZENSET = frozenset(FOOD_TO_CATEGORY)
+
+# Flat list of every food term across categories (for mention extraction)
+ALL_FOOD_TERMS = sorted(FOOD_TERMS_FROZENSET)
+
+# Optional Aho-Corasick automaton: matches all food terms in one pass over
+# the text instead of one substring scan per term. None when pyahocorasick
+# isn't installed; callers fall back to the substring scan.
+try:
+    import ahocorasick
+
+    FOOD_AUTOMATON = ahocorasick.Automaton()
+    for term in ALL_FOOD_TERMS:
+        FOOD_AUTOMATON.add_word(term, term)
+    FOOD_AUTOMATON.make_automaton()
+except ImportError:
+    FOOD_AUTOMATON = None
+
+# Required settings checked by validate_config
+_REQUIRED_SETTINGS = (
+    ('REDDIT_CLIENT_ID', REDDIT_CONFIG['client_id']),
+    ('REDDIT_CLIENT_SECRET', REDDIT_CONFIG['client_secret']),
+    ('SUPABASE_URL', SUPABASE_CONFIG['url']),
+    ('SUPABASE_KEY', SUPABASE_CONFIG['key']),
+)
+
+@functools.lru_cache(maxsize=1)
 def validate_config():
-    """Validate that all required configuration is present"""
-    errors = []
-    
-    if not REDDIT_CONFIG['client_id']:
-        errors.append("REDDIT_CLIENT_ID not set")
-    if not REDDIT_CONFIG['client_secret']:
-        errors.append("REDDIT_CLIENT_SECRET not set")
-    if not SUPABASE_CONFIG['url']:
-        errors.append("SUPABASE_URL not set")
-    if not SUPABASE_CONFIG['key']:
-        errors.append("SUPABASE_KEY not set")
-    
-    if errors:
-        raise ValueError(f"Configuration errors: {', '.join(errors)}")
-    
+    """Validate that all required configuration is present
+
+    Cached: the environment is read once at import, so repeat calls from
+    different entry points return the memoized result.
+    """
+    missing = [name for name, value in _REQUIRED_SETTINGS if not value]
+
+    if missing:
+        raise ValueError(
+            f"Configuration errors: {', '.join(f'{name} not set' for name in missing)}"
+        )
+
     return True
 
 if __name__ == "__main__":
@@ -6,17 +6,12 @@ from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 from supabase import create_client, Client
 from dotenv import load_dotenv
+import asyncio
 import os
 import numpy as np
 
 load_dotenv()
 
-# Initialize Supabase
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
-
 # Page configuration
 st.set_page_config(
     page_title="Food Trend Predictor Dashboard",
@@ -54,66 +49,157 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_supabase() -> Client:
+    """Create the Supabase client once per server process
+
+    Reruns triggered by widget changes reuse the same client (and its
+    keep-alive HTTP connections) instead of re-establishing TLS.
+    """
+    return create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY")
+    )
+
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def fetch_recent_posts(days=7):
     """Fetch recent posts from Supabase"""
     cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
     try:
-        result = supabase.table('reddit_posts')\
-            .select('*')\
+        result = get_supabase().table('reddit_posts')\
+            .select('post_id,score,num_comments,created_utc,subreddit,food_mentions')\
             .gte('created_utc', cutoff_date)\
-            .order('created_utc', desc=True)\
             .execute()
-        return pd.DataFrame(result.data)
+        df = pd.DataFrame(result.data)
+        if df.empty:
+            return df
+
+        # Arrow-backed dtypes shrink the cached frame and hash faster than
+        # object strings; food_mentions stays a list column for explode
+        df = df.astype({
+            'subreddit': 'string[pyarrow]',
+            'score': 'int32[pyarrow]',
+            'num_comments': 'int32[pyarrow]',
+        })
+        df['created_utc'] = pd.to_datetime(df['created_utc'], utc=True, cache=True)
+        return df
     except Exception as e:
         st.error(f"Error fetching posts: {e}")
         return pd.DataFrame()
 
 @st.cache_data(ttl=300)
-def fetch_predictions():
-    """Fetch food trend predictions"""
+def fetch_predictions(limit=200):
+    """Fetch top food trend predictions (server-side limit)"""
     try:
-        result = supabase.table('food_predictions')\
-            .select('*')\
+        result = get_supabase().table('food_predictions')\
+            .select('food,trend_probability,velocity,growth_rate,trending_score')\
             .order('trend_probability', desc=True)\
+            .limit(limit)\
             .execute()
         return pd.DataFrame(result.data)
     except Exception as e:
         st.error(f"Error fetching predictions: {e}")
         return pd.DataFrame()
 
-def analyze_trending_foods(df, days=7):
+@st.cache_data(ttl=300)
+def fetch_trending_foods(days=7, min_mentions=5):
+    """Fetch pre-aggregated trending foods via the trending_foods RPC
+
+    The groupby runs in Postgres (unnest + GROUP BY food), so only a few
+    hundred aggregate rows cross the network instead of every raw post.
+    """
+    try:
+        result = get_supabase().rpc(
+            'trending_foods',
+            {'days': days, 'min_mentions': min_mentions}
+        ).execute()
+        trending = pd.DataFrame(result.data)
+        if trending.empty:
+            return trending
+
+        trending['engagement'] = (
+            trending['total_score'] * 1.0 +
+            trending['total_comments'] * 2.0
+        )
+        return trending.sort_values('engagement', ascending=False)
+    except Exception:
+        # RPC not installed yet - caller falls back to client-side aggregation
+        return pd.DataFrame()
+
+@st.cache_data(ttl=300)
+def fetch_daily_trends(days=7):
+    """Read the precomputed daily rollups written by the ETL
+
+    `python etl.py rollup` maintains daily_food_metrics, so query time is
+    a small sum over food-day rows instead of an explode over raw posts.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).date().isoformat()
+    try:
+        result = get_supabase().table('daily_food_metrics')\
+            .select('food,date,mention_count,total_score,total_comments,unique_subreddits')\
+            .gte('date', cutoff)\
+            .execute()
+        df = pd.DataFrame(result.data)
+        if df.empty:
+            return df
+
+        trending = df.groupby('food', sort=False).agg(
+            total_score=('total_score', 'sum'),
+            mentions=('mention_count', 'sum'),
+            total_comments=('total_comments', 'sum'),
+            # Per-day distinct counts can't be summed; max is a lower bound
+            subreddit_count=('unique_subreddits', 'max')
+        ).reset_index()
+
+        trending['avg_score'] = trending['total_score'] / trending['mentions']
+        trending['avg_comments'] = trending['total_comments'] / trending['mentions']
+        trending['engagement'] = (
+            trending['total_score'] * 1.0 +
+            trending['total_comments'] * 2.0
+        )
+        return trending.sort_values('engagement', ascending=False)
+    except Exception:
+        return pd.DataFrame()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def analyze_trending_foods(df, days=7, min_mentions=1):
     """Analyze trending foods from posts"""
     if df.empty:
         return pd.DataFrame()
     
-    # Explode food_mentions
-    food_data = []
-    for _, row in df.iterrows():
-        if row.get('food_mentions'):
-            for food in row['food_mentions']:
-                food_data.append({
-                    'food': food,
-                    'score': row.get('score', 0),
-                    'num_comments': row.get('num_comments', 0),
-                    'created_utc': row.get('created_utc'),
-                    'subreddit': row.get('subreddit', '')
-                })
-    
-    if not food_data:
+    # Explode food_mentions (vectorized - one row per food per post)
+    food_df = df[['food_mentions', 'score', 'num_comments', 'created_utc', 'subreddit']]\
+        .explode('food_mentions')\
+        .rename(columns={'food_mentions': 'food'})\
+        .dropna(subset=['food'])
+
+    if food_df.empty:
         return pd.DataFrame()
-    
-    food_df = pd.DataFrame(food_data)
-    
-    # Aggregate by food
-    trending = food_df.groupby('food').agg({
-        'score': ['sum', 'mean', 'count'],
-        'num_comments': ['sum', 'mean'],
-        'subreddit': 'nunique'
-    }).reset_index()
-    
-    trending.columns = ['food', 'total_score', 'avg_score', 'mentions', 
-                       'total_comments', 'avg_comments', 'subreddit_count']
+
+    # Drop long-tail foods before aggregating - no point computing six
+    # aggregates for foods the min_mentions filter would discard anyway
+    if min_mentions > 1:
+        counts = food_df['food'].value_counts()
+        keep = counts[counts >= min_mentions].index
+        food_df = food_df[food_df['food'].isin(keep)].copy()
+        if food_df.empty:
+            return pd.DataFrame()
+
+    # Low-cardinality string columns: categorical codes make the groupby
+    # hash ints instead of strings
+    food_df['food'] = food_df['food'].astype('category')
+    food_df['subreddit'] = food_df['subreddit'].astype('category')
+
+    # Aggregate by food - named flat aggregations avoid the MultiIndex
+    # flatten and the redundant sort (we re-sort by engagement below)
+    trending = food_df.groupby('food', sort=False, observed=True).agg(
+        total_score=('score', 'sum'),
+        avg_score=('score', 'mean'),
+        mentions=('score', 'size'),
+        total_comments=('num_comments', 'sum'),
+        avg_comments=('num_comments', 'mean'),
+        subreddit_count=('subreddit', 'nunique')
+    ).reset_index()
     
     # Calculate engagement score
     trending['engagement'] = (
@@ -123,24 +209,99 @@ def analyze_trending_foods(df, days=7):
     
     return trending.sort_values('engagement', ascending=False)
 
+@st.cache_data(ttl=300, show_spinner=False)
 def create_time_series(df):
     """Create time series data for trending analysis"""
     if df.empty:
         return pd.DataFrame()
     
-    df['created_utc'] = pd.to_datetime(df['created_utc'])
-    df['date'] = df['created_utc'].dt.date
-    
-    # Daily aggregation
-    daily = df.groupby('date').agg({
+    # created_utc is already datetime64 from fetch_recent_posts; floor to
+    # day keeps the key as datetime64 (int64 groupby fast path) instead of
+    # Python date objects, and nothing mutates the cached frame
+    daily = df.groupby(df['created_utc'].dt.floor('D')).agg({
         'post_id': 'count',
         'score': 'sum',
         'num_comments': 'sum'
     }).reset_index()
-    
+
     daily.columns = ['date', 'post_count', 'total_score', 'total_comments']
     return daily
 
+# Figure builders are cached so a rerun with unchanged data skips Plotly's
+# deep trace-dict construction and serialization; the cache key is a hash
+# of the input frame
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_trending_bar(trending_foods, days):
+    """Build the top-15 trending foods bar chart"""
+    fig = px.bar(
+        trending_foods.head(15),
+        x='food',
+        y='engagement',
+        color='mentions',
+        title=f"Top 15 Trending Foods (Last {days} Days)",
+        labels={'engagement': 'Engagement Score', 'food': 'Food Item'},
+        color_continuous_scale='Reds',
+        text='mentions'
+    )
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        height=500,
+        showlegend=True
+    )
+    return fig
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_time_series_fig(daily_data):
+    """Build the daily volume/engagement subplot figure"""
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=("Daily Post Volume", "Daily Engagement"),
+        vertical_spacing=0.15
+    )
+
+    # Posts over time
+    fig.add_trace(
+        go.Scatter(
+            x=daily_data['date'],
+            y=daily_data['post_count'],
+            mode='lines+markers',
+            name='Posts',
+            line=dict(color='#667eea', width=3),
+            fill='tozeroy'
+        ),
+        row=1, col=1
+    )
+
+    # Engagement over time
+    fig.add_trace(
+        go.Scatter(
+            x=daily_data['date'],
+            y=daily_data['total_score'] + daily_data['total_comments'],
+            mode='lines+markers',
+            name='Total Engagement',
+            line=dict(color='#FF6B6B', width=3),
+            fill='tozeroy'
+        ),
+        row=2, col=1
+    )
+
+    fig.update_layout(height=600, showlegend=True)
+    return fig
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_heatmap_fig(pivot):
+    """Build the food x subreddit heatmap figure"""
+    fig = px.imshow(
+        pivot,
+        labels=dict(x="Subreddit", y="Food", color="Total Score"),
+        title="Food Mentions Across Subreddits",
+        color_continuous_scale='YlOrRd',
+        aspect='auto'
+    )
+    fig.update_layout(height=600)
+    return fig
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🍕 Food Trend Predictor Dashboard</h1>', 
@@ -158,10 +319,16 @@ def main():
     st.sidebar.markdown("- BERT + XGBoost ML Model")
     st.sidebar.markdown("- Real-time Supabase DB")
     
-    # Fetch data
+    # Fetch data - the two Supabase queries are independent, so overlap
+    # their roundtrips instead of paying both latencies back to back
     with st.spinner("Loading data..."):
-        posts_df = fetch_recent_posts(days_filter)
-        predictions_df = fetch_predictions()
+        async def load_data():
+            return await asyncio.gather(
+                asyncio.to_thread(fetch_recent_posts, days_filter),
+                asyncio.to_thread(fetch_predictions)
+            )
+
+        posts_df, predictions_df = asyncio.run(load_data())
     
     if posts_df.empty:
         st.warning("⚠️ No data available. Run the ETL pipeline first: `python etl.py collect`")
@@ -179,11 +346,13 @@ def main():
         )
     
     with col2:
-        total_engagement = posts_df['score'].sum() + posts_df['num_comments'].sum()
+        # Single pass over one contiguous buffer instead of two column sums
+        engagement_arr = posts_df[['score', 'num_comments']].to_numpy()
+        total_engagement = int(engagement_arr.sum())
         st.metric(
             label="Total Engagement",
             value=f"{total_engagement:,}",
-            delta=f"{total_engagement/len(posts_df):.0f} avg/post"
+            delta=f"{total_engagement/engagement_arr.shape[0]:.0f} avg/post"
         )
     
     with col3:
@@ -196,7 +365,8 @@ def main():
     
     with col4:
         if not predictions_df.empty:
-            trending_count = predictions_df[predictions_df['trend_probability'] > 0.7].shape[0]
+            # Boolean reduction - no masked-copy DataFrame allocation
+            trending_count = int((predictions_df['trend_probability'].to_numpy() > 0.7).sum())
             st.metric(
                 label="Trending Foods",
                 value=trending_count,
@@ -219,49 +389,43 @@ def main():
     with tab1:
         st.markdown("## 🔥 Top Trending Foods")
         
-        trending_foods = analyze_trending_foods(posts_df, days_filter)
-        
+        trending_foods = fetch_trending_foods(days_filter, min_mentions)
+
+        if trending_foods.empty:
+            # Fall back to the ETL's precomputed rollups, then to client-side
+            # aggregation over raw posts
+            trending_foods = fetch_daily_trends(days_filter)
+            if not trending_foods.empty:
+                trending_foods = trending_foods[trending_foods['mentions'] >= min_mentions]
+            else:
+                trending_foods = analyze_trending_foods(posts_df, days_filter, min_mentions)
+
         if not trending_foods.empty:
-            # Filter by minimum mentions
-            trending_foods = trending_foods[trending_foods['mentions'] >= min_mentions]
-            
             col1, col2 = st.columns([2, 1])
             
             with col1:
                 # Bar chart
-                fig = px.bar(
-                    trending_foods.head(15),
-                    x='food',
-                    y='engagement',
-                    color='mentions',
-                    title=f"Top 15 Trending Foods (Last {days_filter} Days)",
-                    labels={'engagement': 'Engagement Score', 'food': 'Food Item'},
-                    color_continuous_scale='Reds',
-                    text='mentions'
-                )
-                fig.update_layout(
-                    xaxis_tickangle=-45,
-                    height=500,
-                    showlegend=True
-                )
+                fig = build_trending_bar(trending_foods, days_filter)
                 st.plotly_chart(fig, use_container_width=True)
             
             with col2:
                 st.markdown("### 🏆 Top 10 Rankings")
-                for idx, row in trending_foods.head(10).iterrows():
-                    rank = trending_foods.index.get_loc(idx) + 1
-                    
+                # itertuples + enumerate avoids per-row Series boxing and the
+                # O(n) get_loc scan; one st.markdown renders all ten cards
+                cards = []
+                for rank, row in enumerate(trending_foods.head(10).itertuples(index=False), start=1):
                     # Emoji based on rank
                     emoji = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉" if rank == 3 else f"{rank}."
-                    
-                    st.markdown(f"""
+
+                    cards.append(f"""
                         <div class="trend-card">
-                            <strong>{emoji} {row['food'].title()}</strong><br>
-                            📝 {row['mentions']} mentions | 
-                            ⭐ {row['avg_score']:.1f} avg score | 
-                            💬 {row['total_comments']:.0f} comments
+                            <strong>{emoji} {row.food.title()}</strong><br>
+                            📝 {row.mentions} mentions |
+                            ⭐ {row.avg_score:.1f} avg score |
+                            💬 {row.total_comments:.0f} comments
                         </div>
-                    """, unsafe_allow_html=True)
+                    """)
+                st.markdown("".join(cards), unsafe_allow_html=True)
             
             # Detailed table
             st.markdown("### 📋 Detailed Breakdown")
@@ -284,48 +448,18 @@ def main():
         daily_data = create_time_series(posts_df)
         
         if not daily_data.empty:
-            fig = make_subplots(
-                rows=2, cols=1,
-                subplot_titles=("Daily Post Volume", "Daily Engagement"),
-                vertical_spacing=0.15
-            )
-            
-            # Posts over time
-            fig.add_trace(
-                go.Scatter(
-                    x=daily_data['date'],
-                    y=daily_data['post_count'],
-                    mode='lines+markers',
-                    name='Posts',
-                    line=dict(color='#667eea', width=3),
-                    fill='tozeroy'
-                ),
-                row=1, col=1
-            )
-            
-            # Engagement over time
-            fig.add_trace(
-                go.Scatter(
-                    x=daily_data['date'],
-                    y=daily_data['total_score'] + daily_data['total_comments'],
-                    mode='lines+markers',
-                    name='Total Engagement',
-                    line=dict(color='#FF6B6B', width=3),
-                    fill='tozeroy'
-                ),
-                row=2, col=1
-            )
-            
-            fig.update_layout(height=600, showlegend=True)
+            fig = build_time_series_fig(daily_data)
             st.plotly_chart(fig, use_container_width=True)
         
         # Distribution charts
         col1, col2 = st.columns(2)
         
         with col1:
-            # Score distribution
+            # Score distribution - a 20k sample preserves the shape while
+            # keeping the payload shipped to the browser bounded
+            hist_df = posts_df if len(posts_df) <= 20000 else posts_df.sample(20000, random_state=42)
             fig = px.histogram(
-                posts_df,
+                hist_df,
                 x='score',
                 nbins=50,
                 title="Post Score Distribution",
@@ -336,7 +470,8 @@ def main():
         
         with col2:
             # Subreddit distribution
-            subreddit_counts = posts_df['subreddit'].value_counts().head(10)
+            # Partial top-10 sort instead of ordering every subreddit count
+            subreddit_counts = posts_df['subreddit'].value_counts(sort=False).nlargest(10)
             fig = px.pie(
                 values=subreddit_counts.values,
                 names=subreddit_counts.index,
@@ -355,9 +490,11 @@ def main():
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                # Prediction scatter plot
+                # Prediction scatter plot - cap the points serialized to the
+                # browser; anything past the top 500 is invisible clutter
+                scatter_df = predictions_df.nlargest(min(len(predictions_df), 500), 'trending_score')
                 fig = px.scatter(
-                    predictions_df,
+                    scatter_df,
                     x='velocity',
                     y='trend_probability',
                     size='trending_score',
@@ -380,16 +517,18 @@ def main():
                     .sort_values('trend_probability', ascending=False)\
                     .head(10)
                 
-                for idx, row in high_prob.iterrows():
-                    prob = row['trend_probability'] * 100
-                    st.markdown(f"""
-                        <div style="padding: 0.5rem; margin: 0.3rem 0; 
-                             background: linear-gradient(90deg, rgba(255,107,107,{prob/100}) 0%, 
+                cards = []
+                for row in high_prob.itertuples(index=False):
+                    prob = row.trend_probability * 100
+                    cards.append(f"""
+                        <div style="padding: 0.5rem; margin: 0.3rem 0;
+                             background: linear-gradient(90deg, rgba(255,107,107,{prob/100}) 0%,
                              rgba(255,217,61,{prob/100}) 100%); border-radius: 5px;">
-                            <strong>{row['food'].title()}</strong><br>
+                            <strong>{row.food.title()}</strong><br>
                             📈 {prob:.1f}% trending probability
                         </div>
-                    """, unsafe_allow_html=True)
+                    """)
+                st.markdown("".join(cards), unsafe_allow_html=True)
             
             # Full predictions table
             st.markdown("### 📊 All Predictions")
@@ -411,47 +550,37 @@ def main():
         st.markdown("## 🗺️ Subreddit Activity Heatmap")
         
         if not posts_df.empty:
-            # Create food x subreddit matrix
-            heatmap_data = []
-            for _, row in posts_df.iterrows():
-                if row.get('food_mentions'):
-                    for food in row['food_mentions']:
-                        heatmap_data.append({
-                            'food': food,
-                            'subreddit': row['subreddit'],
-                            'score': row['score']
-                        })
-            
-            if heatmap_data:
-                heatmap_df = pd.DataFrame(heatmap_data)
-                
-                # Get top foods and subreddits
-                top_foods = heatmap_df['food'].value_counts().head(15).index
-                top_subreddits = heatmap_df['subreddit'].value_counts().head(10).index
-                
+            # Create food x subreddit matrix (vectorized explode)
+            heatmap_df = posts_df[['food_mentions', 'subreddit', 'score']]\
+                .explode('food_mentions')\
+                .rename(columns={'food_mentions': 'food'})\
+                .dropna(subset=['food'])
+            heatmap_df['food'] = heatmap_df['food'].astype('category')
+            heatmap_df['subreddit'] = heatmap_df['subreddit'].astype('category')
+
+            if not heatmap_df.empty:
+                # Keep only the top foods and subreddits - nlargest does a
+                # partial sort instead of ordering the full cardinality
+                top_foods = heatmap_df['food'].value_counts(sort=False).nlargest(15).index
+                top_subreddits = heatmap_df['subreddit'].value_counts(sort=False).nlargest(10).index
+
                 # Filter and pivot
                 filtered = heatmap_df[
-                    (heatmap_df['food'].isin(top_foods)) & 
-                    (heatmap_df['subreddit'].isin(top_subreddits))
+                    heatmap_df['food'].isin(top_foods) &
+                    heatmap_df['subreddit'].isin(top_subreddits)
                 ]
-                
+
                 pivot = filtered.pivot_table(
                     index='food',
                     columns='subreddit',
                     values='score',
                     aggfunc='sum',
-                    fill_value=0
+                    fill_value=0,
+                    observed=True
                 )
                 
                 # Create heatmap
-                fig = px.imshow(
-                    pivot,
-                    labels=dict(x="Subreddit", y="Food", color="Total Score"),
-                    title="Food Mentions Across Subreddits",
-                    color_continuous_scale='YlOrRd',
-                    aspect='auto'
-                )
-                fig.update_layout(height=600)
+                fig = build_heatmap_fig(pivot)
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No food mentions data available for heatmap")
@@ -1,37 +1,91 @@
 import pandas as pd
 import numpy as np
+import joblib
 from datetime import datetime, timedelta
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import os
-from sklearn.preprocessing import StandardScaler
 import re
 
 load_dotenv()
 
+# Optional Numba kernels: fuse the per-row scoring arithmetic into single
+# parallel loops with no intermediate arrays. The plain pandas expressions
+# remain the fallback when numba isn't installed.
+try:
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _engagement_kernel(score, num_comments, upvote_ratio, out):
+        for i in prange(score.size):
+            out[i] = score[i] * 1.0 + num_comments[i] * 2.0 + upvote_ratio[i] * 100.0
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _trending_score_kernel(velocity_pct, growth_pct, engagement_pct, out):
+        for i in prange(velocity_pct.size):
+            out[i] = velocity_pct[i] * 0.3 + growth_pct[i] * 0.4 + engagement_pct[i] * 0.3
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
 supabase: Client = create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_KEY")
 )
 
+def _pct_rank(values):
+    """Percentile ranks (0, 1] via a single stable argsort
+
+    The metric columns are dense and NaN-free, so this skips the tie and
+    NaN handling Series.rank pays for and stays in float32.
+    """
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(values), dtype=np.float32)
+    ranks[order] = np.arange(1, len(values) + 1, dtype=np.float32) / len(values)
+    return ranks
+
 class FoodDataProcessor:
     """Process and transform raw Reddit data for ML models"""
     
     def __init__(self):
-        self.scaler = StandardScaler()
-        
-    def fetch_data(self, days_back=90, min_score=5):
-        """Fetch data from Supabase"""
+        # Normalization stats captured by prepare_features and reused by
+        # transform_features at predict time
+        self.feature_mean = None
+        self.feature_std = None
+        # Food-level frame from the last process_pipeline run
+        self.food_df = None
+
+    def fetch_data(self, days_back=90, min_score=5, page_size=1000):
+        """Fetch data from Supabase
+
+        Only the columns the pipeline consumes are selected (the raw text,
+        url and author fields stay on the server), and results are paged
+        with range() since PostgREST caps unpaginated responses. The page
+        size stays at PostgREST's default max-rows (1000) and the loop
+        runs until an empty page, so a server cap below the requested
+        range can't silently truncate the result.
+        """
         cutoff_date = (datetime.now() - timedelta(days=days_back)).isoformat()
-        
+        columns = ('post_id,subreddit,score,num_comments,upvote_ratio,'
+                   'created_utc,food_mentions,cleaned_text,title')
+
         try:
-            result = supabase.table('reddit_posts')\
-                .select('*')\
-                .gte('created_utc', cutoff_date)\
-                .gte('score', min_score)\
-                .execute()
-            
-            df = pd.DataFrame(result.data)
+            rows = []
+            offset = 0
+            while True:
+                result = supabase.table('reddit_posts')\
+                    .select(columns)\
+                    .gte('created_utc', cutoff_date)\
+                    .gte('score', min_score)\
+                    .range(offset, offset + page_size - 1)\
+                    .execute()
+                if not result.data:
+                    break
+                rows.extend(result.data)
+                offset += len(result.data)
+
+            df = pd.DataFrame(rows)
             print(f"✅ Fetched {len(df)} posts from database")
             return df
         except Exception as e:
@@ -40,105 +94,114 @@ class FoodDataProcessor:
     
     def calculate_engagement_score(self, df):
         """Calculate engagement score for each post"""
-        df['engagement_score'] = (
-            df['score'] * 1.0 + 
-            df['num_comments'] * 2.0 + 
-            df['upvote_ratio'] * 100
-        )
+        if _HAS_NUMBA:
+            out = np.empty(len(df), dtype=np.float64)
+            _engagement_kernel(
+                df['score'].to_numpy(dtype=np.float64),
+                df['num_comments'].to_numpy(dtype=np.float64),
+                df['upvote_ratio'].to_numpy(dtype=np.float64),
+                out
+            )
+            df['engagement_score'] = out
+        else:
+            df['engagement_score'] = (
+                df['score'] * 1.0 +
+                df['num_comments'] * 2.0 +
+                df['upvote_ratio'] * 100
+            )
         return df
     
     def extract_temporal_features(self, df):
         """Extract time-based features"""
+        # int8 is plenty for day/hour/month flags and keeps the columns
+        # small through the explode and groupby steps
         df['created_utc'] = pd.to_datetime(df['created_utc'])
-        df['day_of_week'] = df['created_utc'].dt.dayofweek
-        df['hour'] = df['created_utc'].dt.hour
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        df['month'] = df['created_utc'].dt.month
+        df['day_of_week'] = df['created_utc'].dt.dayofweek.astype('int8')
+        df['hour'] = df['created_utc'].dt.hour.astype('int8')
+        df['is_weekend'] = (df['day_of_week'] >= 5).astype('int8')
+        df['month'] = df['created_utc'].dt.month.astype('int8')
         return df
     
     def calculate_velocity(self, df):
         """Calculate trend velocity (how fast something is growing)"""
-        df = df.sort_values('created_utc')
-        
-        # Calculate 7-day rolling average
-        df['days_since_start'] = (df['created_utc'] - df['created_utc'].min()).dt.days
-        
+        # Single vectorized subtraction on the datetime64 buffer; the old
+        # sort was never relied on downstream
+        days = df['created_utc'].values.astype('datetime64[D]')
+        df['days_since_start'] = (days - days.min()).astype('int32')
+
         return df
     
     def create_food_dataset(self, df):
         """Create a dataset with one row per food item per time period"""
-        food_records = []
-        
-        for _, row in df.iterrows():
-            if not row.get('food_mentions'):
-                continue
-                
-            for food in row['food_mentions']:
-                food_records.append({
-                    'food': food,
-                    'post_id': row['post_id'],
-                    'subreddit': row['subreddit'],
-                    'score': row['score'],
-                    'num_comments': row['num_comments'],
-                    'upvote_ratio': row['upvote_ratio'],
-                    'engagement_score': row.get('engagement_score', 0),
-                    'created_utc': row['created_utc'],
-                    'day_of_week': row.get('day_of_week', 0),
-                    'hour': row.get('hour', 0),
-                    'is_weekend': row.get('is_weekend', 0),
-                    'month': row.get('month', 0),
-                    'text': row.get('cleaned_text', ''),
-                    'title': row.get('title', '')
-                })
-        
-        food_df = pd.DataFrame(food_records)
+        # Vectorized explode: one row per (post, food) without a Python
+        # loop building dicts per row
+        mask = df['food_mentions'].map(lambda x: bool(x) if isinstance(x, list) else False)
+        columns = ['food_mentions', 'post_id', 'subreddit', 'score', 'num_comments',
+                   'upvote_ratio', 'engagement_score', 'created_utc', 'day_of_week',
+                   'hour', 'is_weekend', 'month', 'cleaned_text', 'title']
+        sub = df.loc[mask, [c for c in columns if c in df.columns]]
+
+        food_df = sub.explode('food_mentions')\
+            .rename(columns={'food_mentions': 'food', 'cleaned_text': 'text'})\
+            .reset_index(drop=True)
+
+        # Columns that older rows may be missing keep their 0/'' defaults
+        for col, default in [('engagement_score', 0), ('day_of_week', 0), ('hour', 0),
+                             ('is_weekend', 0), ('month', 0), ('text', ''), ('title', '')]:
+            if col not in food_df.columns:
+                food_df[col] = default
+
+        # Explicit narrow dtypes for the float columns - float32 is plenty
+        # for ratios/scores and halves the bytes the groupbys move
+        food_df = food_df.astype({
+            'upvote_ratio': 'float32',
+            'engagement_score': 'float32',
+        })
+
         print(f"✅ Created food dataset with {len(food_df)} food mentions")
         return food_df
     
     def aggregate_food_metrics(self, food_df, window_days=7):
         """Aggregate metrics for each food item"""
-        food_df = food_df.sort_values('created_utc')
-        
-        # Group by food and calculate metrics
-        food_metrics = []
-        
-        for food in food_df['food'].unique():
-            food_subset = food_df[food_df['food'] == food].copy()
-            
-            if len(food_subset) < 5:  # Skip foods with very few mentions
-                continue
-            
-            # Calculate metrics for different time windows
-            now = food_subset['created_utc'].max()
-            
-            for days in [7, 14, 30]:
-                cutoff = now - timedelta(days=days)
-                recent = food_subset[food_subset['created_utc'] >= cutoff]
-                older = food_subset[food_subset['created_utc'] < cutoff]
-                
-                if len(recent) == 0:
-                    continue
-                
-                metrics = {
-                    'food': food,
-                    'window_days': days,
-                    'mention_count': len(recent),
-                    'avg_score': recent['score'].mean(),
-                    'max_score': recent['score'].max(),
-                    'avg_comments': recent['num_comments'].mean(),
-                    'avg_engagement': recent['engagement_score'].mean(),
-                    'unique_subreddits': recent['subreddit'].nunique(),
-                    'weekend_ratio': recent['is_weekend'].mean(),
-                    'velocity': len(recent) / days,  # Mentions per day
-                    'growth_rate': (len(recent) - len(older)) / max(len(older), 1) if len(older) > 0 else 1.0,
-                    'avg_upvote_ratio': recent['upvote_ratio'].mean(),
-                    'total_engagement': recent['engagement_score'].sum(),
-                    'timestamp': now
-                }
-                
-                food_metrics.append(metrics)
-        
-        metrics_df = pd.DataFrame(food_metrics)
+        # Skip foods with very few mentions
+        total_counts = food_df['food'].value_counts()
+        food_df = food_df[food_df['food'].isin(total_counts[total_counts >= 5].index)]
+
+        if food_df.empty:
+            return pd.DataFrame()
+
+        # Each food's window is anchored at its most recent mention
+        now = food_df.groupby('food')['created_utc'].transform('max')
+
+        # Stack the three windows and aggregate everything in one groupby
+        # instead of slicing the frame per food per window
+        windowed = pd.concat([
+            food_df[food_df['created_utc'] >= now - timedelta(days=days)].assign(window_days=days)
+            for days in [7, 14, 30]
+        ])
+
+        metrics_df = windowed.groupby(['food', 'window_days'], sort=False).agg(
+            mention_count=('score', 'size'),
+            avg_score=('score', 'mean'),
+            max_score=('score', 'max'),
+            avg_comments=('num_comments', 'mean'),
+            avg_engagement=('engagement_score', 'mean'),
+            unique_subreddits=('subreddit', 'nunique'),
+            weekend_ratio=('is_weekend', 'mean'),
+            avg_upvote_ratio=('upvote_ratio', 'mean'),
+            total_engagement=('engagement_score', 'sum'),
+            timestamp=('created_utc', 'max')
+        ).reset_index()
+
+        # Velocity and growth rate as column arithmetic
+        metrics_df['velocity'] = metrics_df['mention_count'] / metrics_df['window_days']
+        older_count = metrics_df['food'].map(total_counts) - metrics_df['mention_count']
+        metrics_df['growth_rate'] = np.where(
+            older_count > 0,
+            (metrics_df['mention_count'] - older_count) / older_count.clip(lower=1),
+            1.0
+        )
+
         print(f"✅ Aggregated metrics for {metrics_df['food'].nunique()} unique foods")
         return metrics_df
     
@@ -147,17 +210,23 @@ class FoodDataProcessor:
         # Define trending based on multiple criteria
         metrics_df = metrics_df[metrics_df['window_days'] == 7].copy()
         
-        # Calculate percentiles
-        metrics_df['velocity_percentile'] = metrics_df['velocity'].rank(pct=True)
-        metrics_df['growth_percentile'] = metrics_df['growth_rate'].rank(pct=True)
-        metrics_df['engagement_percentile'] = metrics_df['avg_engagement'].rank(pct=True)
-        
+        # Calculate percentiles (plain arrays - the intermediate columns
+        # were never used downstream)
+        velocity_pct = _pct_rank(metrics_df['velocity'].to_numpy(dtype=np.float32))
+        growth_pct = _pct_rank(metrics_df['growth_rate'].to_numpy(dtype=np.float32))
+        engagement_pct = _pct_rank(metrics_df['avg_engagement'].to_numpy(dtype=np.float32))
+
         # Combined trending score
-        metrics_df['trending_score'] = (
-            metrics_df['velocity_percentile'] * 0.3 +
-            metrics_df['growth_percentile'] * 0.4 +
-            metrics_df['engagement_percentile'] * 0.3
-        )
+        if _HAS_NUMBA:
+            out = np.empty(len(metrics_df), dtype=np.float32)
+            _trending_score_kernel(velocity_pct, growth_pct, engagement_pct, out)
+            metrics_df['trending_score'] = out
+        else:
+            metrics_df['trending_score'] = (
+                velocity_pct * 0.3 +
+                growth_pct * 0.4 +
+                engagement_pct * 0.3
+            )
         
         # Label top 20% as trending
         threshold = metrics_df['trending_score'].quantile(0.80)
@@ -174,17 +243,50 @@ class FoodDataProcessor:
             'velocity', 'growth_rate', 'avg_upvote_ratio', 'total_engagement'
         ]
         
-        X = metrics_df[feature_columns].copy()
+        # One float32 copy, normalized in place - no fillna copy, no
+        # separate scaler output array
+        arr = metrics_df[feature_columns].to_numpy(dtype=np.float32, copy=True)
+        np.nan_to_num(arr, copy=False)
+
+        self.feature_mean = arr.mean(axis=0)
+        self.feature_std = arr.std(axis=0)
+        self.feature_std[self.feature_std == 0] = 1.0
+        arr -= self.feature_mean
+        arr /= self.feature_std
+
+        X_scaled_df = pd.DataFrame(arr, columns=feature_columns, index=metrics_df.index)
         y = metrics_df['is_trending'].copy()
-        
-        # Handle any missing values
-        X = X.fillna(0)
-        
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X)
-        X_scaled_df = pd.DataFrame(X_scaled, columns=feature_columns, index=X.index)
-        
+
         return X_scaled_df, y, feature_columns
+
+    def transform_features(self, X):
+        """Apply the stored normalization to new feature rows"""
+        if self.feature_mean is None:
+            raise ValueError("Features not fitted. Run prepare_features first.")
+
+        arr = np.asarray(X, dtype=np.float32)
+        return (arr - self.feature_mean) / self.feature_std
+
+    def save_feature_stats(self, path='models'):
+        """Persist the normalization stats for the prediction service"""
+        os.makedirs(path, exist_ok=True)
+        # compress=False keeps the arrays as raw buffers so loaders can
+        # memory-map them
+        joblib.dump(
+            {'mean': self.feature_mean, 'std': self.feature_std},
+            os.path.join(path, 'feature_stats.joblib'),
+            compress=False
+        )
+
+    def load_feature_stats(self, path='models'):
+        """Load persisted normalization stats
+
+        mmap_mode='r' maps the arrays read-only, so multiple service
+        workers share the same pages instead of each holding a copy.
+        """
+        stats = joblib.load(os.path.join(path, 'feature_stats.joblib'), mmap_mode='r')
+        self.feature_mean = stats['mean']
+        self.feature_std = stats['std']
     
     def process_pipeline(self, days_back=90, min_score=5):
         """Run the complete data processing pipeline"""
@@ -205,8 +307,10 @@ class FoodDataProcessor:
         # 4. Calculate velocity
         df = self.calculate_velocity(df)
         
-        # 5. Create food-level dataset
+        # 5. Create food-level dataset (kept on the instance so callers can
+        # reuse the texts without re-querying the database)
         food_df = self.create_food_dataset(df)
+        self.food_df = food_df
         
         # 6. Aggregate metrics
         metrics_df = self.aggregate_food_metrics(food_df)
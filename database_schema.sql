@@ -68,6 +68,27 @@ CREATE TABLE IF NOT EXISTS model_metrics (
     notes TEXT
 );
 
+-- Table 5: Food Categories (lookup table for category-level aggregation)
+CREATE TABLE IF NOT EXISTS food_categories (
+    food TEXT PRIMARY KEY,
+    category TEXT NOT NULL
+);
+
+-- Seed data (mirrors the category groupings used by the prediction service)
+INSERT INTO food_categories (food, category) VALUES
+    ('sushi', 'Asian'), ('ramen', 'Asian'), ('pho', 'Asian'), ('kimchi', 'Asian'),
+    ('dumplings', 'Asian'), ('pad thai', 'Asian'), ('curry', 'Asian'),
+    ('pizza', 'Italian'), ('pasta', 'Italian'), ('tiramisu', 'Italian'),
+    ('burger', 'American'), ('bbq', 'American'), ('pancakes', 'American'), ('waffles', 'American'),
+    ('tacos', 'Mexican'), ('burrito', 'Mexican'), ('empanada', 'Mexican'),
+    ('cake', 'Desserts'), ('cookies', 'Desserts'), ('pie', 'Desserts'),
+    ('ice cream', 'Desserts'), ('chocolate', 'Desserts'), ('churros', 'Desserts'),
+    ('salad', 'Healthy'), ('quinoa', 'Healthy'), ('kale', 'Healthy'),
+    ('avocado', 'Healthy'), ('smoothie', 'Healthy'), ('poke', 'Healthy'),
+    ('tofu', 'Plant-based'), ('tempeh', 'Plant-based'), ('seitan', 'Plant-based'),
+    ('hummus', 'Plant-based'), ('falafel', 'Plant-based')
+ON CONFLICT (food) DO NOTHING;
+
 -- Indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_reddit_posts_created_utc ON reddit_posts(created_utc);
 CREATE INDEX IF NOT EXISTS idx_reddit_posts_subreddit ON reddit_posts(subreddit);
@@ -126,6 +147,63 @@ ORDER BY date DESC;
 
 -- Functions
 
+-- Function to aggregate trending foods server-side (called via supabase.rpc)
+-- Returns one row per food instead of shipping raw posts to the client
+CREATE OR REPLACE FUNCTION trending_foods(
+    days INTEGER DEFAULT 7,
+    min_mentions INTEGER DEFAULT 5
+)
+RETURNS TABLE (
+    food TEXT,
+    total_score BIGINT,
+    avg_score FLOAT,
+    mentions BIGINT,
+    total_comments BIGINT,
+    avg_comments FLOAT,
+    subreddit_count BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        f.food,
+        SUM(p.score)::BIGINT,
+        AVG(p.score)::FLOAT,
+        COUNT(*)::BIGINT,
+        SUM(p.num_comments)::BIGINT,
+        AVG(p.num_comments)::FLOAT,
+        COUNT(DISTINCT p.subreddit)::BIGINT
+    FROM reddit_posts p, unnest(p.food_mentions) AS f(food)
+    WHERE p.created_utc >= NOW() - (days || ' days')::INTERVAL
+    GROUP BY f.food
+    HAVING COUNT(*) >= min_mentions;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Function to aggregate prediction trends per category server-side
+-- (called via supabase.rpc) - ships ~7 aggregate rows instead of 100
+-- prediction rows for the client to group
+CREATE OR REPLACE FUNCTION get_category_trends()
+RETURNS TABLE (
+    category TEXT,
+    avg_probability FLOAT,
+    trending_count BIGINT,
+    top_food TEXT,
+    growth_momentum FLOAT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        c.category,
+        AVG(p.trend_probability)::FLOAT,
+        COUNT(*) FILTER (WHERE p.trend_probability > 0.7)::BIGINT,
+        (ARRAY_AGG(p.food ORDER BY p.trend_probability DESC))[1],
+        COALESCE(AVG(p.growth_rate), 0)::FLOAT
+    FROM food_predictions p
+    JOIN food_categories c ON c.food = p.food
+    GROUP BY c.category;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
 -- Function to calculate food trending score
 CREATE OR REPLACE FUNCTION calculate_trending_score(
     p_food TEXT,
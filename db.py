@@ -0,0 +1,35 @@
+"""
+Shared Supabase client for the whole project
+
+supabase-py keeps a pooled, keep-alive httpx session inside each Client,
+so the way to avoid a TLS handshake per query is to hand every caller the
+same Client instance instead of letting each module create its own.
+ClientOptions pins the request timeouts on that single pool. (supabase-py
+2.x manages its httpx client internally, so a hand-built httpx.Client
+can't be injected here - the shared singleton is what provides the
+connection reuse.)
+"""
+
+import os
+from dotenv import load_dotenv
+from supabase import create_client, Client
+from supabase.client import ClientOptions
+
+load_dotenv()
+
+_client = None
+
+def get_supabase() -> Client:
+    """Return the process-wide Supabase client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = create_client(
+            os.getenv("SUPABASE_URL"),
+            os.getenv("SUPABASE_KEY"),
+            options=ClientOptions(
+                postgrest_client_timeout=10,
+                storage_client_timeout=10,
+                headers={"Connection": "keep-alive"},
+            ),
+        )
+    return _client
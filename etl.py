@@ -1,6 +1,8 @@
 import os
 import praw
+import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -32,37 +34,79 @@ FOOD_SUBREDDITS = [
     'Coffee', 'tea', 'spicy', 'FoodNerds', 'AsianFood'
 ]
 
+# Compiled once - clean_text runs on every collected post
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_SPECIAL_CHAR_RE = re.compile(r'[^\w\s.,!?-]')
+
 def clean_text(text):
     """Clean and normalize text data"""
     if not text:
         return ""
-    # Remove URLs
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-    # Remove special characters but keep basic punctuation
-    text = re.sub(r'[^\w\s.,!?-]', '', text)
+    # Remove URLs, then special characters (keeping basic punctuation)
+    text = _SPECIAL_CHAR_RE.sub('', _URL_RE.sub('', text))
     # Remove extra whitespace
-    text = ' '.join(text.split())
-    return text
+    return ' '.join(text.split())
+
+# Common food keywords (simplified - could be expanded)
+FOOD_KEYWORDS = [
+    'pizza', 'pasta', 'burger', 'sushi', 'ramen', 'tacos', 'burrito',
+    'sandwich', 'salad', 'soup', 'steak', 'chicken', 'beef', 'pork',
+    'fish', 'salmon', 'tuna', 'shrimp', 'tofu', 'tempeh', 'seitan',
+    'rice', 'noodles', 'bread', 'cake', 'cookies', 'pie', 'ice cream',
+    'chocolate', 'cheese', 'egg', 'bacon', 'avocado', 'kimchi',
+    'curry', 'biryani', 'dumplings', 'pho', 'banh mi', 'croissant',
+    'bagel', 'pancakes', 'waffles', 'smoothie', 'kombucha', 'matcha',
+    'açaí', 'quinoa', 'kale', 'cauliflower', 'broccoli', 'brussels sprouts',
+    'hummus', 'falafel', 'shawarma', 'kebab', 'tikka', 'pad thai',
+    'bibimbap', 'poke', 'ceviche', 'empanada', 'churros', 'tiramisu'
+]
+
+# Build an Aho-Corasick automaton once so extraction scans each text a
+# single time instead of once per keyword; None falls back to substring scan
+try:
+    import ahocorasick
+
+    _FOOD_AUTOMATON = ahocorasick.Automaton()
+    for keyword in FOOD_KEYWORDS:
+        _FOOD_AUTOMATON.add_word(keyword, keyword)
+    _FOOD_AUTOMATON.make_automaton()
+except ImportError:
+    _FOOD_AUTOMATON = None
 
 def extract_food_mentions(text):
     """Extract potential food items from text"""
-    # Common food keywords (simplified - could be expanded)
-    food_keywords = [
-        'pizza', 'pasta', 'burger', 'sushi', 'ramen', 'tacos', 'burrito',
-        'sandwich', 'salad', 'soup', 'steak', 'chicken', 'beef', 'pork',
-        'fish', 'salmon', 'tuna', 'shrimp', 'tofu', 'tempeh', 'seitan',
-        'rice', 'noodles', 'bread', 'cake', 'cookies', 'pie', 'ice cream',
-        'chocolate', 'cheese', 'egg', 'bacon', 'avocado', 'kimchi',
-        'curry', 'biryani', 'dumplings', 'pho', 'banh mi', 'croissant',
-        'bagel', 'pancakes', 'waffles', 'smoothie', 'kombucha', 'matcha',
-        'açaí', 'quinoa', 'kale', 'cauliflower', 'broccoli', 'brussels sprouts',
-        'hummus', 'falafel', 'shawarma', 'kebab', 'tikka', 'pad thai',
-        'bibimbap', 'poke', 'ceviche', 'empanada', 'churros', 'tiramisu'
-    ]
-    
     text_lower = text.lower()
-    found_foods = [food for food in food_keywords if food in text_lower]
-    return list(set(found_foods))  # Remove duplicates
+
+    if _FOOD_AUTOMATON is not None:
+        return list({food for _, food in _FOOD_AUTOMATON.iter(text_lower)})
+
+    return list({food for food in FOOD_KEYWORDS if food in text_lower})
+
+# Local cache of already-ingested post ids so re-runs (and crashed runs
+# that restart) skip processing and re-upserting posts seen recently
+SEEN_DB_PATH = 'data/seen_posts.db'
+SEEN_TTL_SECONDS = 86400
+
+def _open_seen_db():
+    """Open (and initialize) the local seen-posts cache"""
+    os.makedirs(os.path.dirname(SEEN_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(SEEN_DB_PATH)
+    conn.execute('CREATE TABLE IF NOT EXISTS seen (post_id TEXT PRIMARY KEY, ts INTEGER)')
+    return conn
+
+def _load_seen_ids(conn, ttl=SEEN_TTL_SECONDS):
+    """Return the set of post ids ingested within the TTL"""
+    cutoff = int(time.time()) - ttl
+    return {row[0] for row in conn.execute('SELECT post_id FROM seen WHERE ts >= ?', (cutoff,))}
+
+def _mark_seen(conn, post_ids):
+    """Record post ids as ingested"""
+    now = int(time.time())
+    conn.executemany(
+        'INSERT OR REPLACE INTO seen (post_id, ts) VALUES (?, ?)',
+        [(post_id, now) for post_id in post_ids]
+    )
+    conn.commit()
 
 def fetch_reddit_posts(subreddit_name, limit=1000, time_filter='month'):
     """Fetch posts from a specific subreddit"""
@@ -110,62 +154,101 @@ def process_submission(submission, subreddit_name):
         'collected_at': datetime.now().isoformat()
     }
 
-def store_posts_in_supabase(posts):
-    """Store processed posts in Supabase"""
-    try:
-        # Insert posts in batches
-        batch_size = 100
-        for i in range(0, len(posts), batch_size):
-            batch = posts[i:i + batch_size]
+def _upsert_batch(batch, max_retries=3):
+    """Upsert one batch with exponential backoff on transient errors"""
+    for attempt in range(max_retries):
+        try:
             supabase.table('reddit_posts').upsert(batch).execute()
-            print(f"Stored batch {i // batch_size + 1}: {len(batch)} posts")
-            time.sleep(0.5)  # Rate limiting
-        
+            return len(batch)
+        except Exception:
+            if attempt == max_retries - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+def store_posts_in_supabase(posts, batch_size=500, max_workers=8):
+    """Store processed posts in Supabase
+
+    Batches are upserted concurrently - this path is latency-bound, so
+    overlapping the roundtrips (instead of sleeping between sequential
+    batches) converts waiting into throughput.
+    """
+    batches = [posts[i:i + batch_size] for i in range(0, len(posts), batch_size)]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stored = sum(executor.map(_upsert_batch, batches))
+        print(f"Stored {stored} posts in {len(batches)} batches")
         return True
     except Exception as e:
         print(f"Error storing posts in Supabase: {e}")
         return False
 
-def collect_posts(target_posts=100000):
-    """Main function to collect posts from all food subreddits"""
+def collect_posts(target_posts=100000, max_workers=8):
+    """Main function to collect posts from all food subreddits
+
+    Subreddit fetches are network-bound, so they run concurrently in a
+    thread pool (PRAW handles Reddit's rate limiting); processing and the
+    periodic database flush stay in the main thread.
+    """
     all_posts = []
     posts_per_subreddit = target_posts // len(FOOD_SUBREDDITS)
-    
+
     print(f"Starting data collection. Target: {target_posts} posts")
     print(f"Collecting ~{posts_per_subreddit} posts from each of {len(FOOD_SUBREDDITS)} subreddits")
-    
-    for idx, subreddit_name in enumerate(FOOD_SUBREDDITS, 1):
-        print(f"\n[{idx}/{len(FOOD_SUBREDDITS)}] Fetching from r/{subreddit_name}...")
-        
-        try:
-            submissions = fetch_reddit_posts(subreddit_name, limit=posts_per_subreddit)
-            print(f"  Retrieved {len(submissions)} posts")
-            
-            # Process each submission
-            for submission in submissions:
-                post_data = process_submission(submission, subreddit_name)
-                all_posts.append(post_data)
-            
-            # Store posts periodically to avoid memory issues
-            if len(all_posts) >= 1000:
-                print(f"\n  Storing {len(all_posts)} posts in database...")
-                store_posts_in_supabase(all_posts)
-                all_posts = []  # Clear memory
-                
-        except Exception as e:
-            print(f"  Error processing r/{subreddit_name}: {e}")
-            continue
-        
-        # Rate limiting
-        time.sleep(2)
-    
+
+    seen_conn = _open_seen_db()
+    seen_ids = _load_seen_ids(seen_conn)
+    skipped = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_reddit_posts, name, posts_per_subreddit): name
+            for name in FOOD_SUBREDDITS
+        }
+
+        for idx, future in enumerate(as_completed(futures), 1):
+            subreddit_name = futures[future]
+
+            try:
+                submissions = future.result()
+                print(f"[{idx}/{len(FOOD_SUBREDDITS)}] r/{subreddit_name}: {len(submissions)} posts")
+
+                # Process each submission, skipping recently-ingested ids
+                for submission in submissions:
+                    if submission.id in seen_ids:
+                        skipped += 1
+                        continue
+                    seen_ids.add(submission.id)
+                    post_data = process_submission(submission, subreddit_name)
+                    all_posts.append(post_data)
+
+                # Store posts periodically to avoid memory issues
+                if len(all_posts) >= 1000:
+                    print(f"\n  Storing {len(all_posts)} posts in database...")
+                    if store_posts_in_supabase(all_posts):
+                        _mark_seen(seen_conn, [post['post_id'] for post in all_posts])
+                    all_posts = []  # Clear memory
+
+            except Exception as e:
+                print(f"  Error processing r/{subreddit_name}: {e}")
+                continue
+
     # Store remaining posts
     if all_posts:
         print(f"\nStoring final {len(all_posts)} posts...")
-        store_posts_in_supabase(all_posts)
-    
+        if store_posts_in_supabase(all_posts):
+            _mark_seen(seen_conn, [post['post_id'] for post in all_posts])
+
+    seen_conn.close()
+
+    if skipped:
+        print(f"Skipped {skipped} already-ingested posts")
+
     print("\n✅ Data collection complete!")
-    
+
+    # Refresh the precomputed rollups the dashboard reads
+    update_daily_food_metrics()
+
     # Get statistics
     try:
         result = supabase.table('reddit_posts').select('*', count='exact').execute()
@@ -173,6 +256,74 @@ def collect_posts(target_posts=100000):
     except Exception as e:
         print(f"Error getting statistics: {e}")
 
+def update_daily_food_metrics(days=90):
+    """Precompute per-food daily rollups into the daily_food_metrics table
+
+    Running this after collection lets the dashboard read a few hundred
+    food-day rows instead of re-aggregating raw posts at query time.
+    """
+    # Page through the raw posts (PostgREST caps each response at its
+    # max-rows setting, so a single select would aggregate only the
+    # first ~1000 rows and write undercounted rollups)
+    cutoff = datetime.fromtimestamp(time.time() - days * 86400).isoformat()
+    page_size = 1000
+    posts = []
+    offset = 0
+    try:
+        while True:
+            result = supabase.table('reddit_posts')\
+                .select('food_mentions, score, num_comments, subreddit, created_utc')\
+                .gte('created_utc', cutoff)\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            if not result.data:
+                break
+            posts.extend(result.data)
+            offset += len(result.data)
+    except Exception as e:
+        print(f"Error fetching posts for rollup: {e}")
+        return False
+
+    # Aggregate by (food, day)
+    daily = {}
+    for post in posts:
+        if not post.get('food_mentions'):
+            continue
+        date = post['created_utc'][:10]
+        for food in post['food_mentions']:
+            entry = daily.setdefault((food, date), {
+                'food': food,
+                'date': date,
+                'mention_count': 0,
+                'total_score': 0,
+                'total_comments': 0,
+                'subreddits': set(),
+            })
+            entry['mention_count'] += 1
+            entry['total_score'] += post.get('score') or 0
+            entry['total_comments'] += post.get('num_comments') or 0
+            entry['subreddits'].add(post.get('subreddit'))
+
+    records = []
+    for entry in daily.values():
+        subreddits = entry.pop('subreddits')
+        entry['unique_subreddits'] = len(subreddits)
+        entry['avg_score'] = entry['total_score'] / entry['mention_count']
+        entry['engagement_score'] = entry['total_score'] + entry['total_comments'] * 2
+        records.append(entry)
+
+    try:
+        batch_size = 100
+        for i in range(0, len(records), batch_size):
+            supabase.table('daily_food_metrics')\
+                .upsert(records[i:i + batch_size], on_conflict='food,date')\
+                .execute()
+        print(f"✅ Updated daily_food_metrics: {len(records)} food-day rows")
+        return True
+    except Exception as e:
+        print(f"Error storing daily metrics: {e}")
+        return False
+
 def get_trending_foods(days=7):
     """Analyze which foods are trending based on recent data"""
     try:
@@ -216,10 +367,15 @@ if __name__ == "__main__":
             # Show trending foods
             days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
             get_trending_foods(days)
+        elif sys.argv[1] == "rollup":
+            # Rebuild daily per-food rollups
+            days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+            update_daily_food_metrics(days)
     else:
         # Default: collect a smaller sample for testing
         print("Usage:")
         print("  python etl.py collect [num_posts]  - Collect posts (default: 100000)")
         print("  python etl.py trends [days]        - Show trending foods (default: 7)")
+        print("  python etl.py rollup [days]        - Rebuild daily food rollups (default: 90)")
         print("\nRunning test collection (1000 posts)...")
         collect_posts(1000)
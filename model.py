@@ -6,6 +6,7 @@ import xgboost as xgb
 from transformers import AutoTokenizer, AutoModel
 import torch
 from torch.utils.data import DataLoader, Dataset
+import hashlib
 import pickle
 import os
 from dotenv import load_dotenv
@@ -21,28 +22,30 @@ supabase: Client = create_client(
 )
 
 class TextDataset(Dataset):
-    """PyTorch dataset for text data"""
+    """PyTorch dataset for text data
+
+    Tokenizes the whole corpus once in a single batched call (the fast
+    tokenizer path) instead of per-sample in __getitem__.
+    """
     def __init__(self, texts, tokenizer, max_length=128):
-        self.texts = texts
-        self.tokenizer = tokenizer
-        self.max_length = max_length
-    
-    def __len__(self):
-        return len(self.texts)
-    
-    def __getitem__(self, idx):
-        text = str(self.texts[idx])
-        encoding = self.tokenizer(
-            text,
+        encoding = tokenizer(
+            [str(text) for text in texts],
             add_special_tokens=True,
-            max_length=self.max_length,
+            max_length=max_length,
             padding='max_length',
             truncation=True,
             return_tensors='pt'
         )
+        self.input_ids = encoding['input_ids']
+        self.attention_mask = encoding['attention_mask']
+
+    def __len__(self):
+        return len(self.input_ids)
+
+    def __getitem__(self, idx):
         return {
-            'input_ids': encoding['input_ids'].flatten(),
-            'attention_mask': encoding['attention_mask'].flatten()
+            'input_ids': self.input_ids[idx],
+            'attention_mask': self.attention_mask[idx]
         }
 
 class FoodTrendPredictor:
@@ -53,48 +56,94 @@ class FoodTrendPredictor:
         self.tokenizer = None
         self.bert_model = None
         self.xgb_model = None
+        # Embedding cache keyed by text hash (fp16 vectors) - repeat texts
+        # skip the BERT forward pass entirely
+        self._emb_cache = {}
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"Using device: {self.device}")
         
     def initialize_bert(self):
         """Initialize BERT model and tokenizer"""
         print(f"Loading BERT model: {self.model_name}")
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
         self.bert_model = AutoModel.from_pretrained(self.model_name)
         self.bert_model.to(self.device)
         self.bert_model.eval()
+
+        if self.device.type == 'cuda':
+            # fp16 weights use tensor cores and halve activation memory
+            self.bert_model = self.bert_model.half()
+            torch.backends.cuda.matmul.allow_tf32 = True
+
+        # Fuse attention/MLP kernels where supported; inference-only, so a
+        # compile failure just means running eager
+        try:
+            self.bert_model = torch.compile(self.bert_model, mode='reduce-overhead')
+        except Exception:
+            pass
+
         print("✅ BERT model loaded")
     
+    @staticmethod
+    def _text_key(text):
+        """Stable cache key for a text"""
+        return hashlib.blake2b(str(text).encode(), digest_size=16).hexdigest()
+
     def extract_bert_embeddings(self, texts, batch_size=16):
-        """Extract BERT embeddings for texts"""
+        """Extract BERT embeddings for texts, memoized by text hash
+
+        Only cache misses go through the BERT forward pass; train followed
+        by predict on the same texts encodes each text once.
+        """
+        keys = [self._text_key(t) for t in texts]
+        miss_indices = [i for i, key in enumerate(keys) if key not in self._emb_cache]
+
+        if miss_indices:
+            new_embeddings = self._encode_texts([texts[i] for i in miss_indices], batch_size)
+            for i, embedding in zip(miss_indices, new_embeddings):
+                self._emb_cache[keys[i]] = embedding.astype(np.float16)
+
+        embeddings = np.vstack([self._emb_cache[key] for key in keys]).astype(np.float32)
+        print(f"✅ Extracted embeddings shape: {embeddings.shape} "
+              f"({len(miss_indices)} encoded, {len(texts) - len(miss_indices)} cached)")
+        return embeddings
+
+    def _encode_texts(self, texts, batch_size=16):
+        """Run texts through BERT and return their [CLS] embeddings"""
         if self.bert_model is None:
             self.initialize_bert()
-        
+
         dataset = TextDataset(texts, self.tokenizer)
         dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
-        
-        embeddings = []
-        
+
+        # Preallocate the output matrix and write each batch into its slice,
+        # avoiding the list-of-arrays plus final vstack copy
+        hidden_size = self.bert_model.config.hidden_size
+        embeddings = np.empty((len(texts), hidden_size), dtype=np.float32)
+        offset = 0
+
         print(f"Extracting BERT embeddings for {len(texts)} texts...")
         with torch.no_grad():
             for batch_idx, batch in enumerate(dataloader):
                 input_ids = batch['input_ids'].to(self.device)
                 attention_mask = batch['attention_mask'].to(self.device)
-                
-                outputs = self.bert_model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask
-                )
-                
+
+                with torch.autocast(device_type=self.device.type,
+                                    dtype=torch.float16,
+                                    enabled=self.device.type == 'cuda'):
+                    outputs = self.bert_model(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask
+                    )
+
                 # Use [CLS] token embedding (first token)
-                cls_embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-                embeddings.append(cls_embeddings)
-                
+                cls_embeddings = outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
+                embeddings[offset:offset + len(cls_embeddings)] = cls_embeddings
+                offset += len(cls_embeddings)
+
                 if (batch_idx + 1) % 10 == 0:
                     print(f"  Processed {(batch_idx + 1) * batch_size}/{len(texts)} texts")
-        
-        embeddings = np.vstack(embeddings)
-        print(f"✅ Extracted embeddings shape: {embeddings.shape}")
+
         return embeddings
     
     def train(self, X_structured, X_text, y, test_size=0.2, random_state=42):
@@ -104,8 +153,9 @@ class FoodTrendPredictor:
         # Extract BERT embeddings
         text_embeddings = self.extract_bert_embeddings(X_text)
         
-        # Combine structured features with text embeddings
-        X_combined = np.hstack([X_structured.values, text_embeddings])
+        # Combine structured features with text embeddings (asarray
+        # accepts both DataFrames and plain arrays)
+        X_combined = np.hstack([np.asarray(X_structured), text_embeddings])
         print(f"Combined feature shape: {X_combined.shape}")
         
         # Split data
@@ -115,29 +165,39 @@ class FoodTrendPredictor:
         
         print(f"Training set: {X_train.shape}, Test set: {X_test.shape}")
         
-        # Train XGBoost
+        # Train XGBoost - QuantileDMatrix bins the features once up front,
+        # hist is the fast tree method, and early stopping trims the tree
+        # count instead of always growing a fixed 200
         print("\nTraining XGBoost classifier...")
-        self.xgb_model = xgb.XGBClassifier(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            objective='binary:logistic',
-            eval_metric='logloss',
-            random_state=random_state,
-            use_label_encoder=False
-        )
-        
-        self.xgb_model.fit(
-            X_train, y_train,
-            eval_set=[(X_test, y_test)],
-            verbose=False
+        dtrain = xgb.QuantileDMatrix(X_train, y_train)
+        dtest = xgb.QuantileDMatrix(X_test, y_test, ref=dtrain)
+
+        params = {
+            'tree_method': 'hist',
+            'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+            'max_depth': 6,
+            'learning_rate': 0.1,
+            'subsample': 0.8,
+            'colsample_bytree': 0.8,
+            'objective': 'binary:logistic',
+            'eval_metric': 'logloss',
+            'seed': random_state,
+        }
+
+        self.xgb_model = xgb.train(
+            params,
+            dtrain,
+            num_boost_round=500,
+            evals=[(dtest, 'test')],
+            early_stopping_rounds=20,
+            verbose_eval=False
         )
-        
-        # Evaluate
-        y_pred = self.xgb_model.predict(X_test)
-        y_pred_proba = self.xgb_model.predict_proba(X_test)[:, 1]
+
+        # Evaluate - Booster.predict uses all rounds by default, so cap
+        # at the early-stopped best iteration
+        y_pred_proba = self.xgb_model.predict(
+            dtest, iteration_range=(0, self.xgb_model.best_iteration + 1))
+        y_pred = (y_pred_proba > 0.5).astype(int)
         
         print("\n📊 Model Evaluation:")
         print(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
@@ -151,11 +211,13 @@ class FoodTrendPredictor:
         print("\nConfusion Matrix:")
         print(confusion_matrix(y_test, y_pred))
         
-        # Feature importance
+        # Feature importance (boosters report only features actually used)
+        feature_names = [f'structured_{i}' for i in range(X_structured.shape[1])] + \
+                        [f'bert_{i}' for i in range(text_embeddings.shape[1])]
+        importance = self.xgb_model.get_score(importance_type='gain')
         feature_importance = pd.DataFrame({
-            'feature': [f'structured_{i}' for i in range(X_structured.shape[1])] + 
-                      [f'bert_{i}' for i in range(text_embeddings.shape[1])],
-            'importance': self.xgb_model.feature_importances_
+            'feature': [feature_names[int(key[1:])] for key in importance],
+            'importance': list(importance.values())
         }).sort_values('importance', ascending=False)
         
         print("\n🔝 Top 10 Important Features:")
@@ -177,23 +239,30 @@ class FoodTrendPredictor:
         # Extract BERT embeddings
         text_embeddings = self.extract_bert_embeddings(X_text)
         
-        # Combine features
-        X_combined = np.hstack([X_structured.values, text_embeddings])
-        
-        # Predict
-        predictions = self.xgb_model.predict(X_combined)
-        probabilities = self.xgb_model.predict_proba(X_combined)[:, 1]
-        
+        # Combine features (asarray accepts both DataFrames and the plain
+        # arrays transform_features returns)
+        X_combined = np.hstack([np.asarray(X_structured), text_embeddings])
+
+        # Predict, capped at the early-stopped best iteration when the
+        # booster carries one (legacy artifacts may not)
+        best_iter = getattr(self.xgb_model, 'best_iteration', None)
+        if best_iter is not None:
+            probabilities = self.xgb_model.predict(
+                xgb.DMatrix(X_combined), iteration_range=(0, best_iter + 1))
+        else:
+            probabilities = self.xgb_model.predict(xgb.DMatrix(X_combined))
+        predictions = (probabilities > 0.5).astype(int)
+
         return predictions, probabilities
     
     def save_model(self, path='models'):
         """Save the trained model"""
         os.makedirs(path, exist_ok=True)
         
-        # Save XGBoost model
-        xgb_path = os.path.join(path, 'xgboost_model.pkl')
-        with open(xgb_path, 'wb') as f:
-            pickle.dump(self.xgb_model, f)
+        # Save XGBoost model in its native JSON format - loads in
+        # milliseconds and stays stable across xgboost versions
+        xgb_path = os.path.join(path, 'xgb_model.json')
+        self.xgb_model.save_model(xgb_path)
         
         # Save model metadata
         metadata = {
@@ -204,24 +273,41 @@ class FoodTrendPredictor:
         metadata_path = os.path.join(path, 'model_metadata.json')
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
-        
+
+        # Persist the embedding cache so retrains only encode new texts
+        if self._emb_cache:
+            with open(os.path.join(path, 'emb_cache.pkl'), 'wb') as f:
+                pickle.dump(self._emb_cache, f)
+
         print(f"✅ Model saved to {path}")
     
     def load_model(self, path='models'):
         """Load a trained model"""
-        # Load XGBoost model
-        xgb_path = os.path.join(path, 'xgboost_model.pkl')
-        with open(xgb_path, 'rb') as f:
-            self.xgb_model = pickle.load(f)
+        # Load XGBoost model (native JSON; fall back to an old pickle save)
+        xgb_path = os.path.join(path, 'xgb_model.json')
+        if os.path.exists(xgb_path):
+            self.xgb_model = xgb.Booster()
+            self.xgb_model.load_model(xgb_path)
+        else:
+            # Old pickles hold an XGBClassifier; predict() works on the
+            # raw Booster, so unwrap it on load
+            with open(os.path.join(path, 'xgboost_model.pkl'), 'rb') as f:
+                self.xgb_model = pickle.load(f).get_booster()
         
         # Load metadata
         metadata_path = os.path.join(path, 'model_metadata.json')
         with open(metadata_path, 'r') as f:
             metadata = json.load(f)
         
+        # Load the embedding cache if one was saved
+        cache_path = os.path.join(path, 'emb_cache.pkl')
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                self._emb_cache = pickle.load(f)
+
         self.model_name = metadata['bert_model_name']
         self.initialize_bert()
-        
+
         print(f"✅ Model loaded from {path}")
 
 def train_pipeline():
@@ -238,29 +324,26 @@ def train_pipeline():
         print("❌ No data available for training")
         return
     
-    # 2. Get text data for BERT
-    # Fetch original posts for food items
-    food_texts = []
-    for food in metrics_df['food'].unique():
-        # Get sample post text for this food
-        result = supabase.table('reddit_posts')\
-            .select('title, cleaned_text')\
-            .contains('food_mentions', [food])\
-            .limit(1)\
-            .execute()
-        
-        if result.data:
-            text = f"{result.data[0].get('title', '')} {result.data[0].get('cleaned_text', '')}"
-            food_texts.append(text)
-        else:
-            food_texts.append(food)  # Use food name as fallback
+    # 2. Get text data for BERT - one sample text per food taken from the
+    # frame the processor already fetched, instead of one Supabase query
+    # per food (the contains() filter can't use a btree index anyway)
+    food_df = processor.food_df
+    sample_texts = food_df\
+        .assign(sample_text=food_df['title'].fillna('') + ' ' + food_df['text'].fillna(''))\
+        .drop_duplicates('food')\
+        .set_index('food')['sample_text']
+
+    # Use the food name as fallback for foods without a sample post
+    food_texts = [sample_texts.get(food, food) for food in metrics_df['food'].unique()]
     
     # 3. Train model
     predictor = FoodTrendPredictor()
     metrics = predictor.train(X, food_texts, y)
     
-    # 4. Save model
+    # 4. Save model and the feature normalization stats the prediction
+    # service needs at inference time
     predictor.save_model()
+    processor.save_feature_stats()
     
     # 5. Store predictions in database
     predictions, probabilities = predictor.predict(X, food_texts)
@@ -5,21 +5,82 @@ Loads the trained model and provides predictions on demand
 
 import pandas as pd
 import numpy as np
+import sys
+import time
 from datetime import datetime, timedelta
-from supabase import create_client, Client
-from dotenv import load_dotenv
 import os
+from db import get_supabase
 from model import FoodTrendPredictor
 from data_processor import FoodDataProcessor
 import json
 
-load_dotenv()
+supabase = get_supabase()
 
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
+# Known shape of food_predictions rows - building the frame from records
+# with explicit columns and dtypes skips pandas' per-row dtype inference
+# and the float64/object columns it would otherwise allocate
+PREDICTION_COLS = ['food', 'trend_probability', 'trending_score', 'velocity',
+                   'growth_rate', 'mention_count', 'is_trending',
+                   'predicted_trending']
+PREDICTION_DTYPES = {
+    'trend_probability': 'float32',
+    'trending_score': 'float32',
+    'velocity': 'float32',
+    'growth_rate': 'float32',
+    'mention_count': 'int32',
+    'is_trending': 'int8',
+    'predicted_trending': 'int8',
+}
+
+# Feature order must match FoodDataProcessor.prepare_features
+_FEATURE_ORDER = (
+    'mention_count', 'avg_score', 'max_score', 'avg_comments',
+    'avg_engagement', 'unique_subreddits', 'weekend_ratio',
+    'velocity', 'growth_rate', 'avg_upvote_ratio', 'total_engagement'
 )
 
+# Recommendation bands, indexed via np.searchsorted over the sorted edges
+# instead of an if/elif ladder per prediction
+_REC_LEVELS = np.array([0.4, 0.6, 0.8])
+_RECOMMENDATIONS = [
+    {
+        'level': 'MINIMAL',
+        'action': 'NO ACTION NEEDED',
+        'suggestions': [
+            'Standard monitoring only'
+        ]
+    },
+    {
+        'level': 'LOW',
+        'action': 'WATCH LIST',
+        'suggestions': [
+            'Keep on radar',
+            'Research similar trends',
+            'Consider for seasonal menu'
+        ]
+    },
+    {
+        'level': 'MEDIUM',
+        'action': 'MONITOR CLOSELY',
+        'suggestions': [
+            'Add to specials menu',
+            'Test with small batch',
+            'Gather customer feedback',
+            'Track social media mentions'
+        ]
+    },
+    {
+        'level': 'HIGH',
+        'action': 'IMMEDIATE ACTION',
+        'suggestions': [
+            'Consider adding to menu immediately',
+            'Stock up on ingredients',
+            'Create marketing campaign',
+            'Monitor competitor offerings'
+        ]
+    },
+]
+
 class TrendPredictionService:
     """Service for real-time food trend predictions"""
     
@@ -27,38 +88,96 @@ class TrendPredictionService:
         self.predictor = FoodTrendPredictor()
         self.processor = FoodDataProcessor()
         self.model_path = model_path
+        # Short-TTL cache for prediction fetches: {top_n: (fetched_at, df)}.
+        # One report run calls get_latest_predictions several times; the
+        # cache keeps that to a single Supabase roundtrip per TTL window.
+        self._predictions_cache = {}
+        self._predictions_ttl = 60
+
+        # Category groupings, plus a reverse food -> category map so the
+        # client-side aggregation can tag every row with one .map() pass
+        self.categories = {
+            'Asian': ['sushi', 'ramen', 'pho', 'kimchi', 'dumplings', 'pad thai', 'curry'],
+            'Italian': ['pizza', 'pasta', 'tiramisu'],
+            'American': ['burger', 'bbq', 'pancakes', 'waffles'],
+            'Mexican': ['tacos', 'burrito', 'empanada'],
+            'Desserts': ['cake', 'cookies', 'pie', 'ice cream', 'chocolate', 'churros'],
+            'Healthy': ['salad', 'quinoa', 'kale', 'avocado', 'smoothie', 'poke'],
+            'Plant-based': ['tofu', 'tempeh', 'seitan', 'hummus', 'falafel']
+        }
+        self._food_to_cat = {f: c for c, fs in self.categories.items() for f in fs}
+
+        # Exact-match memo for predict_new_food, keyed (food, days_back).
+        # Interactive use asks about the same foods repeatedly; a hit skips
+        # the Supabase query, feature build and model predict entirely.
+        self._prediction_memo = {}
+        self._prediction_memo_ttl = 300
+        self._prediction_memo_max = 256
         
-        # Load model if exists
-        if os.path.exists(os.path.join(model_path, 'xgboost_model.pkl')):
+        # Load model if exists (JSON save, or a pickle from older versions)
+        if os.path.exists(os.path.join(model_path, 'xgb_model.json')) or \
+                os.path.exists(os.path.join(model_path, 'xgboost_model.pkl')):
             self.predictor.load_model(model_path)
             print("✅ Model loaded successfully")
         else:
             print("⚠️  No trained model found. Run training first: python model.py")
+
+        # Memory-mapped load of the training-time normalization stats so
+        # transform_features works here without rerunning the pipeline
+        try:
+            self.processor.load_feature_stats(model_path)
+        except (FileNotFoundError, KeyError) as e:
+            print(f"⚠️  No saved feature stats found ({e}). Retrain to generate them.")
     
     def get_latest_predictions(self, top_n=20):
-        """Get latest predictions from database"""
+        """Get latest predictions from database (cached for a short TTL)"""
+        cached = self._predictions_cache.get(top_n)
+        if cached is not None and time.time() - cached[0] < self._predictions_ttl:
+            return cached[1]
+
         try:
             result = supabase.table('food_predictions')\
-                .select('*')\
+                .select(','.join(PREDICTION_COLS))\
                 .order('trend_probability', desc=True)\
                 .limit(top_n)\
                 .execute()
-            
-            return pd.DataFrame(result.data)
+
+            df = pd.DataFrame.from_records(result.data, columns=PREDICTION_COLS)
+            if not df.empty:
+                df = df.astype(PREDICTION_DTYPES, copy=False)
+            self._predictions_cache[top_n] = (time.time(), df)
+            return df
         except Exception as e:
             print(f"Error fetching predictions: {e}")
             return pd.DataFrame()
+
+    def refresh(self):
+        """Drop cached predictions (e.g. after retraining)"""
+        self._predictions_cache.clear()
+
+    def bust_cache(self):
+        """Drop memoized predict_new_food results (call after model reload)"""
+        self._prediction_memo.clear()
     
     def predict_new_food(self, food_name, days_back=30):
         """Predict trending probability for a specific food"""
+        memo_key = (food_name.lower(), days_back)
+        cached = self._prediction_memo.get(memo_key)
+        if cached is not None and time.time() - cached[0] < self._prediction_memo_ttl:
+            return cached[1]
+
         try:
             # Fetch posts mentioning this food
             cutoff_date = (datetime.now() - timedelta(days=days_back)).isoformat()
             
+            # Only the columns the metrics and text sample need, with a
+            # cap on worst-case payload for very popular foods (the GIN
+            # index on food_mentions keeps the contains filter indexed)
             result = supabase.table('reddit_posts')\
-                .select('*')\
+                .select('score,num_comments,upvote_ratio,subreddit,title,cleaned_text')\
                 .contains('food_mentions', [food_name.lower()])\
                 .gte('created_utc', cutoff_date)\
+                .limit(5000)\
                 .execute()
             
             if not result.data:
@@ -69,36 +188,43 @@ class TrendPredictionService:
                 }
             
             df = pd.DataFrame(result.data)
-            
-            # Calculate metrics
+
+            # Calculate metrics on plain arrays - one extraction per
+            # column instead of a fresh pandas pass per statistic
+            score = df['score'].to_numpy(dtype=np.float64)
+            comments = df['num_comments'].to_numpy(dtype=np.float64)
+            engagement_sum = score.sum() + 2.0 * comments.sum()
+
             metrics = {
                 'mention_count': len(df),
-                'avg_score': df['score'].mean(),
-                'max_score': df['score'].max(),
-                'avg_comments': df['num_comments'].mean(),
-                'avg_engagement': (df['score'] + df['num_comments'] * 2).mean(),
+                'avg_score': score.mean(),
+                'max_score': score.max(),
+                'avg_comments': comments.mean(),
+                'avg_engagement': engagement_sum / len(df),
                 'unique_subreddits': df['subreddit'].nunique(),
                 'weekend_ratio': 0.5,  # Placeholder
                 'velocity': len(df) / days_back,
                 'growth_rate': 0.1,  # Placeholder
-                'avg_upvote_ratio': df['upvote_ratio'].mean(),
-                'total_engagement': (df['score'].sum() + df['num_comments'].sum() * 2)
+                'avg_upvote_ratio': df['upvote_ratio'].to_numpy(dtype=np.float64).mean(),
+                'total_engagement': engagement_sum
             }
             
-            # Prepare for prediction
-            X = pd.DataFrame([metrics])
-            X = self.processor.scaler.transform(X)
+            # Prepare for prediction - one float32 row built straight
+            # from the metrics dict, normalized without the DataFrame
+            # detour or sklearn's per-call input validation
+            X = np.array([[metrics[k] for k in _FEATURE_ORDER]], dtype=np.float32)
+            X = self.processor.transform_features(X)
             
             # Get text sample
             text_sample = f"{df.iloc[0]['title']} {df.iloc[0].get('cleaned_text', '')}"
             
             # Predict
             predictions, probabilities = self.predictor.predict(
-                pd.DataFrame(X), 
+                X,
                 [text_sample]
             )
             
-            return {
+            result = {
                 'food': food_name,
                 'status': 'success',
                 'trend_probability': float(probabilities[0]),
@@ -106,7 +232,15 @@ class TrendPredictionService:
                 'metrics': metrics,
                 'recommendation': self._get_recommendation(probabilities[0])
             }
-            
+
+            # Only successful results are worth memoizing; errors and
+            # no-data responses should retry on the next call
+            if len(self._prediction_memo) >= self._prediction_memo_max:
+                self._prediction_memo.clear()
+            self._prediction_memo[memo_key] = (time.time(), result)
+            return result
+
+
         except Exception as e:
             return {
                 'food': food_name,
@@ -116,144 +250,143 @@ class TrendPredictionService:
     
     def _get_recommendation(self, probability):
         """Generate actionable recommendation based on trend probability"""
-        if probability >= 0.8:
-            return {
-                'level': 'HIGH',
-                'action': 'IMMEDIATE ACTION',
-                'suggestions': [
-                    'Consider adding to menu immediately',
-                    'Stock up on ingredients',
-                    'Create marketing campaign',
-                    'Monitor competitor offerings'
-                ]
-            }
-        elif probability >= 0.6:
-            return {
-                'level': 'MEDIUM',
-                'action': 'MONITOR CLOSELY',
-                'suggestions': [
-                    'Add to specials menu',
-                    'Test with small batch',
-                    'Gather customer feedback',
-                    'Track social media mentions'
-                ]
-            }
-        elif probability >= 0.4:
-            return {
-                'level': 'LOW',
-                'action': 'WATCH LIST',
-                'suggestions': [
-                    'Keep on radar',
-                    'Research similar trends',
-                    'Consider for seasonal menu'
-                ]
-            }
-        else:
-            return {
-                'level': 'MINIMAL',
-                'action': 'NO ACTION NEEDED',
-                'suggestions': [
-                    'Standard monitoring only'
-                ]
-            }
+        # Branchless band lookup over the shared threshold table
+        return _RECOMMENDATIONS[np.searchsorted(_REC_LEVELS, probability, side='right')]
     
-    def get_category_trends(self):
-        """Analyze trends by food category"""
-        # Food categories
-        categories = {
-            'Asian': ['sushi', 'ramen', 'pho', 'kimchi', 'dumplings', 'pad thai', 'curry'],
-            'Italian': ['pizza', 'pasta', 'tiramisu'],
-            'American': ['burger', 'bbq', 'pancakes', 'waffles'],
-            'Mexican': ['tacos', 'burrito', 'empanada'],
-            'Desserts': ['cake', 'cookies', 'pie', 'ice cream', 'chocolate', 'churros'],
-            'Healthy': ['salad', 'quinoa', 'kale', 'avocado', 'smoothie', 'poke'],
-            'Plant-based': ['tofu', 'tempeh', 'seitan', 'hummus', 'falafel']
-        }
-        
-        predictions = self.get_latest_predictions(top_n=100)
-        
+    def get_category_trends(self, predictions=None):
+        """Analyze trends by food category
+
+        The aggregation runs server-side via the get_category_trends RPC
+        (see database_schema.sql), so only one row per category crosses
+        the wire. The client-side groupby is kept as a fallback for
+        databases without the function, and is also used when a caller
+        like generate_insights_report passes an already-fetched
+        predictions frame.
+        """
+        if predictions is None:
+            try:
+                result = supabase.rpc('get_category_trends').execute()
+                if result.data:
+                    return {
+                        row['category']: {
+                            'avg_probability': float(row['avg_probability']),
+                            'trending_count': int(row['trending_count']),
+                            'top_food': row['top_food'],
+                            'growth_momentum': float(row['growth_momentum'] or 0)
+                        }
+                        for row in result.data
+                    }
+            except Exception as e:
+                print(f"⚠️  Category RPC unavailable, aggregating client-side: {e}")
+            predictions = self.get_latest_predictions(top_n=100)
+
         if predictions.empty:
             return {}
-        
-        category_trends = {}
-        
-        for category, foods in categories.items():
-            category_data = predictions[predictions['food'].isin(foods)]
-            
-            if not category_data.empty:
-                category_trends[category] = {
-                    'avg_probability': float(category_data['trend_probability'].mean()),
-                    'trending_count': int((category_data['trend_probability'] > 0.7).sum()),
-                    'top_food': category_data.nlargest(1, 'trend_probability')['food'].values[0],
-                    'growth_momentum': float(category_data['growth_rate'].mean()) if 'growth_rate' in category_data else 0
-                }
-        
-        return category_trends
+
+        # Tag every row with its category in one .map() pass, then let a
+        # single groupby compute all the per-category aggregates instead
+        # of rescanning the frame once per category
+        tagged = predictions[predictions['food'].isin(self._food_to_cat)].copy()
+        if tagged.empty:
+            return {}
+
+        tagged['category'] = tagged['food'].map(self._food_to_cat)
+        tagged['is_hot'] = tagged['trend_probability'] > 0.7
+        if 'growth_rate' not in tagged.columns:
+            tagged['growth_rate'] = 0.0
+
+        # Sorting first makes 'first' the top food per category
+        tagged = tagged.sort_values('trend_probability', ascending=False)
+        agg = tagged.groupby('category', sort=False).agg(
+            avg_probability=('trend_probability', 'mean'),
+            trending_count=('is_hot', 'sum'),
+            top_food=('food', 'first'),
+            growth_momentum=('growth_rate', 'mean')
+        )
+
+        return {
+            category: {
+                'avg_probability': float(row.avg_probability),
+                'trending_count': int(row.trending_count),
+                'top_food': row.top_food,
+                'growth_momentum': float(row.growth_momentum)
+            }
+            for category, row in zip(agg.index, agg.itertuples(index=False))
+        }
     
     def generate_insights_report(self, days=7):
         """Generate a comprehensive insights report"""
-        print(f"\n{'='*70}")
-        print(f"🍕 FOOD TREND INSIGHTS REPORT - {datetime.now().strftime('%Y-%m-%d')}")
-        print(f"{'='*70}\n")
-        
+        # Buffer the whole report and emit it in a single write instead
+        # of dozens of individually flushed print calls
+        buf = []
+        buf.append(f"\n{'='*70}")
+        buf.append(f"🍕 FOOD TREND INSIGHTS REPORT - {datetime.now().strftime('%Y-%m-%d')}")
+        buf.append(f"{'='*70}\n")
+
         # Get predictions
         predictions = self.get_latest_predictions(top_n=50)
-        
+
         if predictions.empty:
             print("❌ No predictions available")
             return
-        
+
         # Top Trending
-        print("🔥 TOP 10 TRENDING FOODS:")
-        print("-" * 70)
+        buf.append("🔥 TOP 10 TRENDING FOODS:")
+        buf.append("-" * 70)
+        # Titlecase and percentages computed in one vectorized pass over
+        # the columns instead of per printed row
         top_10 = predictions.head(10)
-        for idx, row in top_10.iterrows():
-            prob = row['trend_probability'] * 100
-            trend_indicator = "📈" if row.get('growth_rate', 0) > 0.1 else "📊"
-            print(f"{trend_indicator} {row['food'].title():20} | "
-                  f"Probability: {prob:5.1f}% | "
-                  f"Velocity: {row.get('velocity', 0):.2f}/day")
-        
+        top_10 = top_10.assign(
+            food_title=top_10['food'].str.title(),
+            prob_pct=top_10['trend_probability'] * 100
+        )
+        # itertuples skips the per-row Series construction iterrows pays for
+        for row in top_10.itertuples(index=False):
+            trend_indicator = "📈" if getattr(row, 'growth_rate', 0) > 0.1 else "📊"
+            buf.append(f"{trend_indicator} {row.food_title:20} | "
+                       f"Probability: {row.prob_pct:5.1f}% | "
+                       f"Velocity: {getattr(row, 'velocity', 0):.2f}/day")
+
         # Category Analysis
-        print(f"\n📊 CATEGORY TRENDS:")
-        print("-" * 70)
-        category_trends = self.get_category_trends()
-        for category, data in sorted(category_trends.items(), 
-                                     key=lambda x: x[1]['avg_probability'], 
+        buf.append(f"\n📊 CATEGORY TRENDS:")
+        buf.append("-" * 70)
+        category_trends = self.get_category_trends(predictions)
+        for category, data in sorted(category_trends.items(),
+                                     key=lambda x: x[1]['avg_probability'],
                                      reverse=True):
-            print(f"{category:15} | "
-                  f"Avg: {data['avg_probability']*100:5.1f}% | "
-                  f"Trending: {data['trending_count']:2} items | "
-                  f"Top: {data['top_food'].title()}")
-        
+            buf.append(f"{category:15} | "
+                       f"Avg: {data['avg_probability']*100:5.1f}% | "
+                       f"Trending: {data['trending_count']:2} items | "
+                       f"Top: {data['top_food'].title()}")
+
         # Actionable Insights
-        print(f"\n💡 ACTIONABLE INSIGHTS:")
-        print("-" * 70)
-        
+        buf.append(f"\n💡 ACTIONABLE INSIGHTS:")
+        buf.append("-" * 70)
+
         high_potential = predictions[predictions['trend_probability'] > 0.7]
         if not high_potential.empty:
-            print(f"✅ {len(high_potential)} foods with high trending potential")
-            print(f"   Recommend immediate menu consideration for:")
-            for food in high_potential.head(5)['food']:
-                print(f"   • {food.title()}")
-        
+            buf.append(f"✅ {len(high_potential)} foods with high trending potential")
+            buf.append(f"   Recommend immediate menu consideration for:")
+            for food in high_potential.head(5)['food'].str.title():
+                buf.append(f"   • {food}")
+
         emerging = predictions[
-            (predictions['trend_probability'] > 0.5) & 
+            (predictions['trend_probability'] > 0.5) &
             (predictions['trend_probability'] <= 0.7)
         ]
         if not emerging.empty:
-            print(f"\n⚡ {len(emerging)} emerging trends to monitor:")
-            for food in emerging.head(5)['food']:
-                print(f"   • {food.title()}")
-        
-        print(f"\n{'='*70}")
-        print("Report generated successfully!")
-        print(f"{'='*70}\n")
+            buf.append(f"\n⚡ {len(emerging)} emerging trends to monitor:")
+            for food in emerging.head(5)['food'].str.title():
+                buf.append(f"   • {food}")
+
+        buf.append(f"\n{'='*70}")
+        buf.append("Report generated successfully!")
+        buf.append(f"{'='*70}\n")
+
+        sys.stdout.write('\n'.join(buf) + '\n')
 
 def main():
     """CLI interface for prediction service"""
-    import sys
-    
     service = TrendPredictionService()
     
     if len(sys.argv) > 1:
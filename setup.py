@@ -8,6 +8,8 @@ import os
 import sys
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 def check_python_version():
     """Ensure Python 3.8+"""
     if sys.version_info < (3, 8):
@@ -52,11 +54,8 @@ def check_env_file():
         return False
     
     print("✅ .env file exists")
-    
-    # Check for required variables
-    from dotenv import load_dotenv
-    load_dotenv()
-    
+
+    # Check for required variables (.env is loaded once in main)
     required_vars = [
         'REDDIT_CLIENT_ID',
         'REDDIT_CLIENT_SECRET',
@@ -65,10 +64,12 @@ def check_env_file():
         'SUPABASE_KEY'
     ]
     
-    missing = []
-    for var in required_vars:
-        if not os.getenv(var) or os.getenv(var).startswith('your_'):
-            missing.append(var)
+    # One snapshot of the env surface instead of two os.getenv walks
+    # per variable
+    env = {var: os.environ.get(var, '') for var in required_vars}
+
+    missing = [var for var in required_vars
+               if not env[var] or env[var].startswith('your_')]
     
     if missing:
         print(f"⚠️  Missing or default values for: {', '.join(missing)}")
@@ -92,9 +93,7 @@ def test_reddit_connection():
     """Test Reddit API connection"""
     try:
         import praw
-        from dotenv import load_dotenv
-        load_dotenv()
-        
+
         reddit = praw.Reddit(
             client_id=os.getenv("REDDIT_CLIENT_ID"),
             client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
@@ -114,15 +113,11 @@ def test_reddit_connection():
 def test_supabase_connection():
     """Test Supabase connection"""
     try:
-        from supabase import create_client
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        
+        # Same pooled client the prediction service uses at runtime
+        from db import get_supabase
+
+        supabase = get_supabase()
+
         # Test connection
         supabase.table('reddit_posts').select('*').limit(1).execute()
         
@@ -167,6 +162,9 @@ def main():
     print("🍕 Food Trend Predictor - Setup")
     print("="*70)
     print()
+
+    # Parse .env once for every check below instead of per function
+    load_dotenv()
     
     checks = [
         ("Python Version", check_python_version),
@@ -7,8 +7,11 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 import logging
+from functools import lru_cache
 from pathlib import Path
 
+from config import FOOD_TO_CATEGORY
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,6 +24,59 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Optional Numba kernels for the numeric helpers: one fused loop per
+# series instead of several pandas passes. The pandas expressions remain
+# the fallback when numba isn't installed.
+try:
+    from numba import njit, prange
+
+    @njit(cache=True, fastmath=True)
+    def _zscore_outliers_kernel(a, threshold):
+        n = a.size
+        m = a.mean()
+        ss = 0.0
+        for i in range(n):
+            d = a[i] - m
+            ss += d * d
+        # ddof=1 to match Series.std
+        s = (ss / (n - 1)) ** 0.5 if n > 1 else 0.0
+        out = np.empty(n, dtype=np.bool_)
+        for i in range(n):
+            out[i] = s > 0.0 and abs(a[i] - m) / s > threshold
+        return out
+
+    @njit(cache=True, fastmath=True)
+    def _moving_average_kernel(a, window):
+        out = np.empty(a.size, dtype=np.float64)
+        acc = 0.0
+        for i in range(a.size):
+            acc += a[i]
+            if i >= window:
+                acc -= a[i - window]
+                out[i] = acc / window
+            else:
+                out[i] = acc / (i + 1)
+        return out
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _engagement_batch_kernel(score, comments, upvote_ratio, out):
+        for i in prange(score.size):
+            out[i] = score[i] * 1.0 + comments[i] * 2.0 + upvote_ratio[i] * 100.0
+
+    @njit(cache=True, fastmath=True)
+    def _ema_kernel(a, alpha):
+        out = np.empty(a.size, dtype=np.float64)
+        acc = a[0]
+        out[0] = acc
+        for i in range(1, a.size):
+            acc = alpha * a[i] + (1.0 - alpha) * acc
+            out[i] = acc
+        return out
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
 def setup_logging(log_file='logs/food_trends.log'):
     """Set up logging configuration"""
     Path('logs').mkdir(exist_ok=True)
@@ -87,27 +143,34 @@ def calculate_engagement_score(score, comments, upvote_ratio=None):
         engagement += upvote_ratio * 100
     return engagement
 
+def engagement_batch(score, comments, upvote_ratio=None):
+    """Batch calculate_engagement_score over whole arrays"""
+    score = np.asarray(score, dtype=np.float64)
+    comments = np.asarray(comments, dtype=np.float64)
+    if upvote_ratio is None:
+        return score * 1.0 + comments * 2.0
+
+    upvote_ratio = np.asarray(upvote_ratio, dtype=np.float64)
+    if _HAS_NUMBA:
+        out = np.empty(score.size, dtype=np.float64)
+        _engagement_batch_kernel(score, comments, upvote_ratio, out)
+        return out
+    return score * 1.0 + comments * 2.0 + upvote_ratio * 100
+
+# Shared probability bands: searchsorted over the sorted edges picks the
+# band without an if/elif ladder, and the same tables work for whole
+# arrays via np.take(LABELS, np.searchsorted(TREND_LEVELS, probs, 'right'))
+TREND_LEVELS = np.array([0.4, 0.6, 0.8])
+TREND_EMOJIS = ["📉", "📊", "📈", "🔥"]
+RECOMMENDATION_LABELS = ["MINIMAL", "LOW", "MEDIUM", "HIGH"]
+
 def get_trend_emoji(probability):
     """Get emoji based on trend probability"""
-    if probability >= 0.8:
-        return "🔥"
-    elif probability >= 0.6:
-        return "📈"
-    elif probability >= 0.4:
-        return "📊"
-    else:
-        return "📉"
+    return TREND_EMOJIS[np.searchsorted(TREND_LEVELS, probability, side='right')]
 
 def get_recommendation_level(probability):
     """Get recommendation level based on probability"""
-    if probability >= 0.8:
-        return "HIGH"
-    elif probability >= 0.6:
-        return "MEDIUM"
-    elif probability >= 0.4:
-        return "LOW"
-    else:
-        return "MINIMAL"
+    return RECOMMENDATION_LABELS[np.searchsorted(TREND_LEVELS, probability, side='right')]
 
 def batch_process(items, batch_size=100):
     """Process items in batches"""
@@ -133,7 +196,13 @@ def deduplicate_posts(posts_df):
 
 def filter_by_date_range(df, start_date, end_date, date_column='created_utc'):
     """Filter dataframe by date range"""
-    df[date_column] = pd.to_datetime(df[date_column])
+    # Explicit ISO8601 format keeps the parse on pandas' vectorized C
+    # path; skip it entirely when the column is already datetime64. The
+    # parse stays naive - the ETL stores naive isoformat strings, and
+    # callers pass naive datetime bounds
+    if not pd.api.types.is_datetime64_any_dtype(df[date_column]):
+        df[date_column] = pd.to_datetime(df[date_column], format='ISO8601',
+                                         cache=True)
     mask = (df[date_column] >= start_date) & (df[date_column] <= end_date)
     return df[mask]
 
@@ -143,24 +212,50 @@ def get_top_n(df, column, n=10, ascending=False):
 
 def create_time_buckets(df, date_column='created_utc', freq='D'):
     """Create time buckets for aggregation"""
-    df[date_column] = pd.to_datetime(df[date_column])
-    df['time_bucket'] = df[date_column].dt.to_period(freq)
+    if not pd.api.types.is_datetime64_any_dtype(df[date_column]):
+        df[date_column] = pd.to_datetime(df[date_column], format='ISO8601',
+                                         cache=True)
+    # floor keeps datetime64 buckets (no Period boxing) for fixed
+    # frequencies; calendar frequencies still need to_period
+    if freq in ('D', 'H', 'h'):
+        df['time_bucket'] = df[date_column].dt.floor(freq)
+    else:
+        df['time_bucket'] = df[date_column].dt.to_period(freq)
     return df
 
 def calculate_percentile(value, series):
     """Calculate percentile of value in series"""
     return (series < value).sum() / len(series)
 
+def percentile_batch(values, series):
+    """Percentile of each value in series, via one sort + searchsorted
+
+    Sorting once and binary-searching all the values replaces the
+    O(len(series)) comparison scan calculate_percentile pays per value.
+    """
+    sorted_vals = np.sort(np.asarray(series, dtype=np.float64))
+    idx = np.searchsorted(sorted_vals, np.asarray(values, dtype=np.float64), side='left')
+    return idx / sorted_vals.size
+
 def moving_average(series, window=7):
     """Calculate moving average"""
+    if _HAS_NUMBA and len(series) > 0:
+        out = _moving_average_kernel(series.to_numpy(dtype=np.float64), window)
+        return pd.Series(out, index=series.index)
     return series.rolling(window=window, min_periods=1).mean()
 
 def exponential_moving_average(series, alpha=0.3):
     """Calculate exponential moving average"""
+    if _HAS_NUMBA and len(series) > 0:
+        out = _ema_kernel(series.to_numpy(dtype=np.float64), alpha)
+        return pd.Series(out, index=series.index)
     return series.ewm(alpha=alpha, adjust=False).mean()
 
 def detect_outliers(series, threshold=3):
     """Detect outliers using z-score method"""
+    if _HAS_NUMBA and len(series) > 0:
+        out = _zscore_outliers_kernel(series.to_numpy(dtype=np.float64), float(threshold))
+        return pd.Series(out, index=series.index)
     z_scores = np.abs((series - series.mean()) / series.std())
     return z_scores > threshold
 
@@ -195,15 +290,19 @@ def validate_data_quality(df, required_columns):
     if missing_cols:
         issues.append(f"Missing columns: {missing_cols}")
     
-    # Check for nulls
-    null_counts = df[required_columns].isnull().sum()
+    # Check for nulls - count() skips nulls in a single C pass, so
+    # len - count gives null totals without a boolean-mask allocation
+    null_counts = len(df) - df[required_columns].count()
     high_null_cols = null_counts[null_counts > len(df) * 0.5].index.tolist()
     if high_null_cols:
         issues.append(f"High null percentage (>50%) in: {high_null_cols}")
-    
-    # Check for duplicates
-    if df.duplicated().any():
-        issues.append(f"Found {df.duplicated().sum()} duplicate rows")
+
+    # Check for duplicates on post_id only (matches deduplicate_posts)
+    # instead of hashing every column of every row
+    if 'post_id' in df.columns:
+        dup_count = df['post_id'].duplicated().sum()
+        if dup_count:
+            issues.append(f"Found {dup_count} duplicate rows")
     
     if issues:
         logger.warning(f"Data quality issues: {'; '.join(issues)}")
@@ -258,31 +357,33 @@ def get_food_emoji(food_name):
 
 def categorize_food(food_name):
     """Categorize food item"""
-    from config import FOOD_CATEGORIES
-    
-    food_lower = food_name.lower()
-    for category, foods in FOOD_CATEGORIES.items():
-        if food_lower in foods:
-            return category
-    return 'Other'
+    return FOOD_TO_CATEGORY.get(food_name.lower(), 'Other')
+
+def categorize_foods(series):
+    """Categorize a Series of food names in one vectorized pass"""
+    return series.str.lower().map(FOOD_TO_CATEGORY).fillna('Other')
 
+@lru_cache(maxsize=12)
 def get_seasonal_foods(month):
-    """Get typical seasonal foods for a month"""
+    """Get typical seasonal foods for a month, as a shared tuple
+
+    Cached per month; tuples keep the shared return value immutable.
+    """
     seasonal = {
-        1: ['soup', 'stew', 'hot chocolate'],  # Winter
-        2: ['soup', 'stew', 'hot chocolate'],
-        3: ['salad', 'smoothie'],  # Spring
-        4: ['salad', 'smoothie'],
-        5: ['salad', 'smoothie'],
-        6: ['ice cream', 'popsicle', 'bbq'],  # Summer
-        7: ['ice cream', 'popsicle', 'bbq'],
-        8: ['ice cream', 'popsicle', 'bbq'],
-        9: ['pumpkin', 'apple pie'],  # Fall
-        10: ['pumpkin', 'apple pie'],
-        11: ['turkey', 'stuffing'],
-        12: ['cookies', 'gingerbread'],  # Winter
+        1: ('soup', 'stew', 'hot chocolate'),  # Winter
+        2: ('soup', 'stew', 'hot chocolate'),
+        3: ('salad', 'smoothie'),  # Spring
+        4: ('salad', 'smoothie'),
+        5: ('salad', 'smoothie'),
+        6: ('ice cream', 'popsicle', 'bbq'),  # Summer
+        7: ('ice cream', 'popsicle', 'bbq'),
+        8: ('ice cream', 'popsicle', 'bbq'),
+        9: ('pumpkin', 'apple pie'),  # Fall
+        10: ('pumpkin', 'apple pie'),
+        11: ('turkey', 'stuffing'),
+        12: ('cookies', 'gingerbread'),  # Winter
     }
-    return seasonal.get(month, [])
+    return seasonal.get(month, ())
 
 if __name__ == "__main__":
     # Test utilities